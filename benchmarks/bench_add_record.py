@@ -0,0 +1,60 @@
+"""Benchmark of the ORM and `COPY` write paths of `Database.add_record`.
+
+Writes the same synthetic mentions with both paths, checks that the bulk
+path returns one ID per row, and deletes the rows again. Run it against
+a scratch database.
+
+    python -m benchmarks.bench_add_record --config config/dev.json --rows 20000
+"""
+
+import argparse
+import time
+
+from pony.orm import select
+
+from connectors.postgres import Database, _qualified_name
+
+
+def make_rows(summary, n_rows: int, tag: str):
+    return [{"summary_id": summary, "cui": f"{tag}{i:08d}"} for i in range(n_rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default="config/dev.json")
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    db = Database.from_config(path=args.config)
+    with db.session_handler():
+        summary = select(s for s in db.summaries).first()
+        if summary is None:
+            raise SystemExit("The benchmark needs at least one summary.")
+
+        start = time.perf_counter()
+        db.add_record(make_rows(summary, args.rows, "ORM"), db.mentions)
+        orm_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ids = db.bulk_add_records(
+            make_rows(summary, args.rows, "COPY"),
+            db.mentions,
+            batch_size=args.batch_size,
+        )
+        bulk_seconds = time.perf_counter() - start
+    assert len(set(ids)) == args.rows, "Expected one ID per row."
+
+    db._execute_raw(
+        f"DELETE FROM {_qualified_name(db.mentions)} "
+        "WHERE cui LIKE 'ORM%' OR cui LIKE 'COPY%'"
+    )
+    print(f" ORM: {args.rows / orm_seconds:10.1f} rows/s")
+    print(
+        f"COPY: {args.rows / bulk_seconds:10.1f} rows/s "
+        f"({orm_seconds / bulk_seconds:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
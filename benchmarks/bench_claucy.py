@@ -0,0 +1,106 @@
+"""Benchmark of the `claucy` component.
+
+Parses the texts once, then times clause extraction with the current
+helpers and with the ones they replaced (a new `Matcher` per sentence,
+list scans and sorted subtrees), and checks that both find the same
+clauses.
+
+    python -m benchmarks.bench_claucy --model en_core_sci_sm --texts conclusions.txt
+"""
+
+import argparse
+import timeit
+from unittest import mock
+
+import spacy
+from spacy.tokens import Span
+from spacy.matcher import Matcher
+
+from stages.spacy_pipeline import claucy
+
+
+def reference_get_verb_chunks(span):
+    verb_matcher = Matcher(span.vocab)
+    verb_matcher.add(
+        "Auxiliary verb phrase aux-verb",
+        [
+            [{"POS": "AUX"}, {"POS": "VERB"}],
+        ],
+    )
+    verb_matcher.add("Auxiliary verb phrase", [[{"POS": "AUX"}]])
+    verb_matcher.add(
+        "Verb phrase",
+        [[{"POS": "VERB"}]],
+    )
+    verb_chunks = []
+    for match in [span[start:end] for _, start, end in verb_matcher(span)]:
+        if match.root not in [vp.root for vp in verb_chunks]:
+            verb_chunks.append(match)
+    return verb_chunks
+
+
+def reference_extract_span_from_entity(token):
+    ent_subtree = sorted([c for c in token.subtree], key=lambda x: x.i)
+    return Span(token.doc, start=ent_subtree[0].i, end=ent_subtree[-1].i + 1)
+
+
+def reference_helpers():
+    return mock.patch.multiple(
+        claucy,
+        _get_verb_chunks=reference_get_verb_chunks,
+        extract_span_from_entity=reference_extract_span_from_entity,
+    )
+
+
+def _offsets(span):
+    return None if span is None else (span.start, span.end)
+
+
+def clause_keys(doc):
+    return [
+        (
+            clause.type,
+            _offsets(clause.subject),
+            _offsets(clause.verb),
+            _offsets(clause.indirect_object),
+            _offsets(clause.direct_object),
+            _offsets(clause.complement),
+            tuple(_offsets(adverbial) for adverbial in clause.adverbials),
+        )
+        for clause in doc._.clauses
+    ]
+
+
+def run(docs, repeat):
+    def extract():
+        for doc in docs:
+            claucy.extract_clauses_doc(doc)
+
+    seconds = min(timeit.repeat(extract, number=1, repeat=repeat))
+    return sum(len(list(doc.sents)) for doc in docs) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="en_core_sci_sm")
+    parser.add_argument("--texts", required=True, help="One text per line.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    nlp = spacy.load(args.model)
+    with open(args.texts, "r", encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    docs = list(nlp.pipe(texts))
+
+    with reference_helpers():
+        reference_rate = run(docs, args.repeat)
+        expected = [clause_keys(doc) for doc in docs]
+    rate = run(docs, args.repeat)
+    assert [clause_keys(doc) for doc in docs] == expected, "Clauses differ."
+
+    print(f"reference: {reference_rate:10.1f} sentences/s")
+    print(f"  current: {rate:10.1f} sentences/s ({rate / reference_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
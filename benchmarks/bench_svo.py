@@ -0,0 +1,49 @@
+"""Benchmark of SVO extraction.
+
+Parses the texts once, then times `findSVO` over token objects against
+`findSVOsArrays` over batched dependency arrays, and checks that both
+find the same triples.
+
+    python -m benchmarks.bench_svo --model en_core_sci_sm --texts conclusions.txt
+"""
+
+import argparse
+import timeit
+
+import spacy
+
+from stages.svo import findSVO, findSVOsArrays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="en_core_sci_sm")
+    parser.add_argument("--texts", required=True, help="One text per line.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    nlp = spacy.load(args.model)
+    with open(args.texts, "r", encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    docs = list(nlp.pipe(texts))
+
+    expected = [set(findSVO(doc)) for doc in docs]
+    found = [set(svos) for _, svos in findSVOsArrays(docs, args.batch_size)]
+    assert found == expected, "Triples differ."
+
+    def tokens():
+        for doc in docs:
+            list(findSVO(doc))
+
+    def arrays():
+        for _ in findSVOsArrays(docs, args.batch_size):
+            pass
+
+    for name, extract in [("findSVO", tokens), ("findSVOsArrays", arrays)]:
+        seconds = min(timeit.repeat(extract, number=1, repeat=args.repeat))
+        print(f"{name:>14}: {len(docs) / seconds:10.1f} docs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Micro-benchmark of the per-document triple graph.
+
+Compares `triples_to_graph` with the `networkx.DiGraph` builder it
+replaced, on synthetic documents, and checks both give the same nodes
+and edges.
+
+    python -m benchmarks.bench_triple_graph --docs 2000
+"""
+
+import argparse
+import timeit
+
+import spacy
+import networkx as nx
+from spacy.tokens import Span
+
+from stages.triple_extractor import triples_to_graph
+from stages.spacy_pipeline.information_extractor import Triple
+
+
+def networkx_triples_to_graph(triples) -> nx.DiGraph:
+    G = nx.DiGraph()
+    for triple in triples:
+        if triple is None:
+            continue
+        if len(triple.subject.ents) == 0 or len(triple.object_.ents) == 0:
+            continue
+        subjects = triple.subject
+        for subject in subjects.ents:
+            G.add_node(subject, node_type="concept", label=subject.text)
+        ordered_ents = subjects.ents.copy()
+        ordered_ents.reverse()
+        for i in range(len(ordered_ents) - 1):
+            G.add_edge(ordered_ents[i], ordered_ents[i + 1], edge_type="_REL")
+        objects = triple.object_
+        for object_ in objects.ents:
+            G.add_node(object_, node_type="concept")
+            G.add_edge(
+                object_, subjects.ents[-1], edge_type="_VERB", name=triple.verb.text
+            )
+    return G
+
+
+def make_triples(nlp, n_clauses: int):
+    # "a0 b0 causes c0 d0 and a1 b1 causes c1 d1 and ..." with every noun
+    # an entity, and every clause repeated once to exercise deduplication.
+    words = []
+    for i in range(n_clauses):
+        words += [f"a{i}", f"b{i}", "causes", f"c{i}", f"d{i}", "and"]
+    doc = nlp(" ".join(words))
+    doc.ents = [
+        Span(doc, start, start + 1, "ENTITY")
+        for i in range(n_clauses)
+        for start in (6 * i, 6 * i + 1, 6 * i + 3, 6 * i + 4)
+    ]
+    triples = [
+        Triple(
+            doc[6 * i : 6 * i + 2],
+            doc[6 * i + 2 : 6 * i + 3],
+            doc[6 * i + 3 : 6 * i + 5],
+        )
+        for i in range(n_clauses)
+    ]
+    return triples + triples
+
+
+def _offsets(span):
+    return span.start, span.end
+
+
+def check_same_graph(triples):
+    graph = triples_to_graph(triples)
+    reference = networkx_triples_to_graph(triples)
+    assert {_offsets(n) for n in graph.nodes} == {_offsets(n) for n in reference}
+    assert {
+        (_offsets(u), _offsets(v), tuple(sorted(d.items()))) for u, v, d in graph.edges
+    } == {
+        (_offsets(u), _offsets(v), tuple(sorted(d.items())))
+        for u, v, d in reference.edges(data=True)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--clauses", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    nlp = spacy.blank("en")
+    docs = [make_triples(nlp, args.clauses) for _ in range(args.docs)]
+    check_same_graph(docs[0])
+
+    def run(builder, list_edges):
+        def consume():
+            for triples in docs:
+                graph = builder(triples)
+                list(graph.nodes)
+                list_edges(graph)
+
+        return min(timeit.repeat(consume, number=1, repeat=args.repeat)) / args.docs
+
+    builders = [
+        ("networkx", networkx_triples_to_graph, lambda G: list(G.edges(data=True))),
+        ("TripleGraph", triples_to_graph, lambda G: G.edges),
+    ]
+    for name, builder, list_edges in builders:
+        print(f"{name:>12}: {run(builder, list_edges) * 1e6:8.1f} us/doc")
+
+
+if __name__ == "__main__":
+    main()
@@ -60,6 +60,8 @@ class GraphDB:
             "CREATE INDEX synonym_index_cui IF NOT EXISTS FOR (n:synonym) ON (n.cui)",
             "CREATE INDEX predicate_index_doi IF NOT EXISTS FOR ()-[r:_VERB]-() ON (r.doi)",
             "CREATE INDEX relational_index_doi IF NOT EXISTS FOR ()-[r:_REL]-() ON (r.doi)",
+            "CREATE INDEX conclusion_index_id IF NOT EXISTS FOR (n:conclusion) ON (n.conclusion_id)",
+            "CREATE INDEX predicate_index_conclusion IF NOT EXISTS FOR ()-[r:_VERB]-() ON (r.conclusion_id)",
         ]
         for stmt in stmts:
             self.query(stmt)
@@ -1,13 +1,23 @@
 """Database interface"""
 
+import io
 import json
 import logging
-from datetime import datetime
+import itertools
+from collections import namedtuple
+from types import SimpleNamespace
+from typing import Dict, List
+
+from more_itertools import chunked
 from pony.orm import (
     commit,
+    desc,
+    raw_sql,
     select,
+    Json,
 )
 from pony.orm.core import (
+    Entity,
     EntityMeta,
     CacheIndexError,
     TransactionIntegrityError,
@@ -22,15 +32,88 @@ from models.db_tables import (
     Article,
     Summary,
     Abbreviation,
+    AbbreviationFrequency,
     SimpleConclusions,
     SimpleSubstitutedConclusions,
     Node,
+    Mention,
     Edge,
-    Log,
+    ConceptNode,
+    SynonymNode,
+    PredicateEdge,
+    Progress,
+    Watermark,
 )
 
 logger = PipelineLogger("Postgres")
 
+_cursor_ids = itertools.count()
+
+ABBREVIATION_FREQUENCY_TRIGGER: str = """
+CREATE INDEX IF NOT EXISTS abbreviation_frequencies_lookup
+    ON {frequencies} (abbreviation, frequency DESC);
+
+CREATE OR REPLACE FUNCTION {schema}.count_abbreviation() RETURNS trigger AS $$
+BEGIN
+    -- An update counts as the deletion of the old and insertion of the new row
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE {frequencies}
+            SET frequency = frequency - 1
+            WHERE abbreviation = OLD.abbreviation AND meaning = OLD.meaning;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {frequencies} AS f (abbreviation, meaning, frequency)
+        VALUES (NEW.abbreviation, NEW.meaning, 1)
+        ON CONFLICT (abbreviation, meaning)
+        DO UPDATE SET frequency = f.frequency + 1;
+        RETURN NEW;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS abbreviation_frequency_trigger ON {abbreviations};
+CREATE TRIGGER abbreviation_frequency_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF abbreviation, meaning ON {abbreviations}
+    FOR EACH ROW EXECUTE FUNCTION {schema}.count_abbreviation();
+"""
+
+
+def _qualified_name(table) -> str:
+    return ".".join(f'"{part}"' for part in table._table_)
+
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _watermark_key(table, downstream):
+    if not isinstance(downstream, list):
+        downstream = [downstream]
+    names = sorted(".".join(tbl._table_) for tbl in downstream)
+    return ".".join(table._table_), ",".join(names)
+
+
+def _copy_value(value) -> str:
+    """`value` in the text format of `COPY`."""
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def _column_values(attrs, row):
+    # Same conversions Pony applies when creating an entity
+    for attr in attrs:
+        value = row.get(attr.name, attr.default)
+        if callable(value):
+            value = value()
+        if isinstance(value, Entity):
+            value = value.get_pk()
+        elif attr.py_type is Json and value is not None:
+            value = json.dumps(value)
+        elif value is None and not attr.is_required and not attr.nullable:
+            value = ""
+        yield value
+
 
 class Database:
     def __init__(
@@ -43,6 +126,20 @@ class Database:
         database="SciGraph_staging",
     ):
         self.db = db
+        self.articles = Article
+        self.abbreviations = Abbreviation
+        self.abbreviation_frequencies = AbbreviationFrequency
+        self.summaries = Summary
+        self.simple_conclusions = SimpleConclusions
+        self.simple_substituted_conclusions = SimpleSubstitutedConclusions
+        self.nodes = Node
+        self.mentions = Mention
+        self.edges = Edge
+        self.concept_nodes = ConceptNode
+        self.synonym_nodes = SynonymNode
+        self.predicate_edges = PredicateEdge
+        self.progress = Progress
+        self.watermarks = Watermark
         if self.db.provider is None:
             self.db.bind(
                 provider="postgres",
@@ -53,41 +150,101 @@ class Database:
                 database=database,
             )
             self.db.generate_mapping(create_tables=True)
+            self._create_triggers()
+            self._create_indexes()
         else:
             logger.debug("Using previously bound database")
-        self.articles = Article
-        self.abbreviations = Abbreviation
-        self.summaries = Summary
-        self.simple_conclusions = SimpleConclusions
-        self.simple_substituted_conclusions = SimpleSubstitutedConclusions
-        self.nodes = Node
-        self.edges = Edge
-        self.logs = Log
         logger.debug(f"Connected to database:\t{user}@{host}:{port}/{database}")
 
     @property
     def session_handler(self):
         return DBSessionContextManager()
 
+    def _execute_raw(self, *stmts, params=None, dry_run=False):
+        # Bypass Pony's SQL parser, which treats `$` as a parameter marker.
+        # All statements run in one transaction, returns their row counts.
+        # With `dry_run`, the transaction is rolled back.
+        row_counts = []
+        with self.session_handler():
+            connection = self.db.get_connection()
+            with connection.cursor() as cursor:
+                for stmt in stmts:
+                    cursor.execute(stmt, params)
+                    row_counts.append(cursor.rowcount)
+            if dry_run:
+                connection.rollback()
+            else:
+                connection.commit()
+        return row_counts
+
+    def _stream_raw(self, stmt, batch_size=10_000, params=None, named=False):
+        """Rows of `stmt` from a server-side cursor, fetched `batch_size` at a
+        time, so the result set never has to fit into memory. With `named`,
+        rows are named tuples.
+
+        The cursor is held across commits, so that rows can be written on
+        the same connection while reading. Postgres keeps the rest of the
+        result set in a temporary store from the first commit on."""
+        with self.session_handler():
+            connection = self.db.get_connection()
+            name = f"stream_{next(_cursor_ids)}"
+            with connection.cursor(name=name, withhold=True) as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(stmt, params)
+                if not named:
+                    yield from cursor
+                    return
+                row_type = None
+                for row in cursor:
+                    if row_type is None:
+                        # Only known after the first fetch
+                        columns = [column.name for column in cursor.description]
+                        row_type = namedtuple("Row", columns, rename=True)
+                    yield row_type._make(row)
+
+    def _create_triggers(self):
+        stmt = ABBREVIATION_FREQUENCY_TRIGGER.format(
+            schema=f'"{self.abbreviations._table_[0]}"',
+            abbreviations=_qualified_name(self.abbreviations),
+            frequencies=_qualified_name(self.abbreviation_frequencies),
+        )
+        self._execute_raw(stmt)
+
+    def _create_indexes(self):
+        # NEWER mode reads every table with a `date_added` as a range scan
+        # over (date_added, id), see `_get_newer_records`
+        stmts = [
+            f"CREATE INDEX IF NOT EXISTS {table._table_[-1]}_date_added_id "
+            f"ON {_qualified_name(table)} (date_added, id)"
+            for table in self.db.entities.values()
+            if "date_added" in table._adict_
+        ]
+        self._execute_raw(*stmts)
+
     # def __del__(self):
     #    self.db.disconnect()
 
-    def _commit(self, table, last_record):
-        commit()
-        checkpoint = {
-            "table": ".".join(table._table_),
-            "last_processed": last_record.id,
-            "timestamp": datetime.now(),
-        }
-        self.logs(**checkpoint)
+    def _commit(self, last_record, n_rows=0, progress=None, upstream_ids=None):
         commit()
+        if progress is not None:
+            progress.checkpoint(last_record.id, n_rows, upstream_ids)
 
     # @db_session
-    def _add_record(self, data, table, periodic_commit=50, duplicates: str = "raise"):
+    def _add_record(
+        self,
+        data,
+        table,
+        periodic_commit=50,
+        duplicates: str = "raise",
+        progress=None,
+        upstream_ids=None,
+    ):
         last_record = type("placeholder", (), {"id": 0})
+        n_rows = 0
         for e, elem in enumerate(data):
             try:
                 last_record = table(**elem)
+                n_rows += 1
             except TypeError as e:
                 print(elem)
                 raise (e)
@@ -98,22 +255,135 @@ class Database:
                 raise
             if not e % periodic_commit:
                 # logging.debug("Processing %s: %s" % (e, last_record))
-                self._commit(table, last_record)
+                self._commit(
+                    last_record,
+                    n_rows,
+                    progress,
+                    None if upstream_ids is None else (),
+                )
+                n_rows = 0
         # finally:
-        self._commit(table, last_record)
+        self._commit(last_record, n_rows, progress, upstream_ids)
         return last_record.id
 
+    def _copy_rows(self, cursor, rows, table) -> List[int]:
+        """Write `rows` with a single `COPY` on `cursor` and return their
+        IDs. The IDs are drawn from the table's sequence up front, in the
+        order of the rows."""
+        attrs = [attr for attr in table._attrs_ if not attr.is_collection]
+        qualified_name = _qualified_name(table)
+        columns = ", ".join(f'"{attr.column}"' for attr in attrs)
+        buffer = io.StringIO()
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+            "FROM generate_series(1, %s)",
+            (qualified_name, len(rows)),
+        )
+        ids = sorted(id_ for id_, in cursor)
+        for id_, row in zip(ids, rows):
+            values = _column_values(attrs, {**row, "id": id_})
+            buffer.write("\t".join(map(_copy_value, values)) + "\n")
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {qualified_name} ({columns}) FROM STDIN", buffer)
+        return ids
+
+    def _copy_tables(self, rows) -> Dict["db.Entity", List[int]]:
+        """Write the rows of several tables, keyed by table, in one
+        transaction and return their IDs by table."""
+        ids = {}
+        with self.session_handler():
+            connection = self.db.get_connection()
+            with connection.cursor() as cursor:
+                for table, table_rows in rows.items():
+                    if table_rows:
+                        ids[table] = self._copy_rows(cursor, table_rows, table)
+            connection.commit()
+        return ids
+
+    def bulk_add_records(
+        self, data, table, batch_size=10_000, progress=None
+    ) -> List[int]:
+        """Write plain dicts to `table` with `COPY`, `batch_size` rows per
+        transaction, and return the IDs they were assigned.
+
+        Related entities may be passed as entities or as IDs, `Json` columns
+        as Python objects. Unlike `add_record`, duplicates always raise."""
+        if isinstance(table, str):
+            table = getattr(self, table)
+        ids = []
+        with self.session_handler():
+            for batch in chunked(data, batch_size):
+                ids += self._copy_tables({table: batch})[table]
+                self._commit(SimpleNamespace(id=ids[-1]), len(batch), progress)
+        return ids
+
+    def _bulk_add_record(self, data, tables, batch_size=10_000, progress=None):
+        # Rows for several tables are collected until one table has a full
+        # batch. The rows of all tables are then written in one transaction,
+        # so that an element tagged with its `upstream_id` is either written
+        # completely or not at all when a run is resumed.
+        pending = {tbl: [] for tbl in tables}
+        done = []
+        last_id = 0
+
+        def flush():
+            nonlocal pending, done, last_id
+            n_rows = sum(map(len, pending.values()))
+            for ids in self._copy_tables(pending).values():
+                last_id = ids[-1]
+            self._commit(SimpleNamespace(id=last_id), n_rows, progress, done)
+            pending, done = {tbl: [] for tbl in tables}, []
+
+        with self.session_handler():
+            for elem in data:
+                for tbl in tables:
+                    pending[tbl].extend(elem.get(tbl._table_[-1], ()))
+                if elem.get("upstream_id") is not None:
+                    done.append(elem["upstream_id"])
+                if any(len(rows) >= batch_size for rows in pending.values()):
+                    flush()
+            if done or any(pending.values()):
+                flush()
+        return last_id
+
     def get_summaries(self):
         elems = select(c for c in self.summaries if c.named_entities.id)
 
         # elems = select((c.id, c.conclusion, c.named_entities.matched_term, c.named_entities.preferred_term) for c in self.summaries if c.named_entities.id)
         yield from elems
 
-    def add_record(self, data, table, periodic_commit=50, duplicates: str = "raise"):
+    def add_record(
+        self,
+        data,
+        table,
+        periodic_commit=50,
+        duplicates: str = "raise",
+        bulk: bool = False,
+        progress=None,
+    ):
+        """Write `data` to `table`, or to every table in a list of tables,
+        and return the last ID.
+
+        With `bulk`, rows are written with `COPY` in batches (see
+        `bulk_add_records`) instead of one entity at a time. Every commit is
+        reported to `progress`, a `ProgressTracker`."""
+        if bulk:
+            if duplicates != "raise":
+                raise ValueError("Bulk writes do not support skipping duplicates.")
+            if isinstance(table, (str, EntityMeta)):
+                ids = self.bulk_add_records(data, table, progress=progress)
+                return ids[-1] if ids else 0
+            return self._bulk_add_record(data, table, progress=progress)
         if isinstance(table, (str, EntityMeta)):
-            return self._add_record(data, table, periodic_commit, duplicates=duplicates)
+            return self._add_record(
+                data, table, periodic_commit, duplicates=duplicates, progress=progress
+            )
         elif isinstance(table, list):
+            last_id = 0
             for elem in data:
+                # See `_bulk_add_record` for elements tagged with their source
+                upstream_id = elem.get("upstream_id")
+                upstream_ids = None if upstream_id is None else ()
                 for tbl in table:
                     try:
                         filtered_records = [elem[tbl._table_[-1]]]
@@ -121,15 +391,121 @@ class Database:
                         continue
                     for filtered_record in filtered_records:
                         last_id = self._add_record(
-                            filtered_record, tbl, periodic_commit
+                            filtered_record,
+                            tbl,
+                            periodic_commit,
+                            progress=progress,
+                            upstream_ids=upstream_ids,
                         )
+                if upstream_id is not None and progress is not None:
+                    progress.checkpoint(last_id, 0, [upstream_id])
             return last_id
         raise TypeError("Expected table, name, or dict  got %s" % type(table))
 
+    def refresh_abbreviation_frequencies(self):
+        """Rebuild the corpus abbreviation table from scratch.
+
+        Only needed once for abbreviations written before the trigger
+        existed, afterwards the table is maintained on every insert, update
+        and delete."""
+        frequencies = _qualified_name(self.abbreviation_frequencies)
+        stmt = f"""
+TRUNCATE {frequencies};
+INSERT INTO {frequencies} (abbreviation, meaning, frequency)
+    SELECT abbreviation, meaning, count(*)
+    FROM {_qualified_name(self.abbreviations)}
+    GROUP BY abbreviation, meaning;
+"""
+        self._execute_raw(stmt)
+
+    def get_abbreviation_meanings(self, min_frequency: int = 1):
+        """Most frequent meaning for every abbreviation in the corpus. Ties
+        go to the meaning that sorts first."""
+        query = f"""
+SELECT DISTINCT ON (abbreviation) abbreviation, meaning
+FROM {_qualified_name(self.abbreviation_frequencies)}
+WHERE frequency >= $min_frequency
+ORDER BY abbreviation, frequency DESC, meaning"""
+        yield from self.db.select(query)
+
+    def truncate(self, *tables):
+        """Delete every row of `tables`, given as entities or names."""
+        tables = [getattr(self, t) if isinstance(t, str) else t for t in tables]
+        self._execute_raw(f"TRUNCATE {', '.join(map(_qualified_name, tables))}")
+
+    def stage_nodes(self, restage=False, dry_run=False):
+        """Copy concepts and their synonyms from `nodes` to the
+        `concept_nodes` and `synonym_nodes` staging tables inside Postgres.
+
+        Every CUI becomes one concept, named after the canonical name of its
+        first node. Synonyms of a CUI that only differ in case are merged.
+        Rows that are already staged are skipped, so re-runs only add new
+        concepts and synonyms. With `restage`, both tables are emptied first
+        in the same transaction. Returns the number of rows added per table,
+        which with `dry_run` are counted in a transaction that is rolled
+        back."""
+        nodes = _qualified_name(self.nodes)
+        concept_nodes = _qualified_name(self.concept_nodes)
+        synonym_nodes = _qualified_name(self.synonym_nodes)
+        concepts = f"""
+INSERT INTO {concept_nodes} (node_id, cui, name, date_added)
+SELECT DISTINCT ON (n.cui_or_name)
+    n.id, n.cui_or_name, initcap(n.attributes->>'canonical_name'), now()
+FROM {nodes} n
+WHERE n.node_type = 'concept'
+    AND NOT EXISTS (SELECT 1 FROM {concept_nodes} c WHERE c.cui = n.cui_or_name)
+ORDER BY n.cui_or_name, n.id"""
+        synonyms = f"""
+INSERT INTO {synonym_nodes} (cui, name, date_added)
+SELECT n.cui_or_name, initcap(min(n.attributes->>'synonym')), now()
+FROM {nodes} n
+WHERE n.node_type = 'synonym'
+    AND NOT EXISTS (
+        SELECT 1 FROM {synonym_nodes} s
+        WHERE s.cui = n.cui_or_name
+            AND lower(s.name) = lower(n.attributes->>'synonym')
+    )
+GROUP BY n.cui_or_name, lower(n.attributes->>'synonym')"""
+        stmts = [concepts, synonyms]
+        if restage:
+            stmts.insert(0, f"TRUNCATE {concept_nodes}, {synonym_nodes}")
+        *_, n_concepts, n_synonyms = self._execute_raw(*stmts, dry_run=dry_run)
+        return {"concept_nodes": n_concepts, "synonym_nodes": n_synonyms}
+
+    def save_progress(self, state: dict):
+        """Insert or update the progress record of a run, see
+        `connectors.progress.ProgressTracker`."""
+        stmt = f"""
+INSERT INTO {_qualified_name(self.progress)}
+    (stage, run_id, upstream_id, n_read, n_written, last_written_id,
+     started, updated, finished)
+VALUES
+    (%(stage)s, %(run_id)s, %(upstream_id)s, %(n_read)s, %(n_written)s,
+     %(last_written_id)s, %(started)s, now(), %(finished)s)
+ON CONFLICT (stage, run_id) DO UPDATE SET
+    upstream_id = EXCLUDED.upstream_id,
+    n_read = EXCLUDED.n_read,
+    n_written = EXCLUDED.n_written,
+    last_written_id = EXCLUDED.last_written_id,
+    updated = EXCLUDED.updated,
+    finished = EXCLUDED.finished"""
+        self._execute_raw(stmt, params=state)
+
+    def get_progress(self, stage: str):
+        """Latest progress record of `stage`, or None."""
+        progress = (
+            select(p for p in self.progress if p.stage == stage)
+            .order_by(lambda p: desc(p.started))
+            .first()
+        )
+        if progress is None:
+            return None
+        return progress.to_dict()
+
     def get_by_id(self, table, id):
         return table[id]
 
-    def _build_query(self, table, mode, downstream=None, order_by=None):
+    def _build_query(self, table, mode, downstream=None, order_by=None, after_id=None):
         if isinstance(table, str):
             table = getattr(self, table)
         if not isinstance(table, EntityMeta):
@@ -146,6 +522,9 @@ class Database:
                 f"Unknown mode '{mode}'. Allowed values are {','.join(select_functions.keys())}"
             )
         query = select_function(table, downstream)
+        if after_id is not None:
+            # Resuming a run, see `PipelineStep.run_all`
+            query = query.filter(lambda c: c.id > after_id)
         if order_by is not None:
             if isinstance(order_by, str):
                 order_by = [order_by]
@@ -154,18 +533,58 @@ class Database:
                 query = query.order_by(column)
         return query
 
+    def _stream_records(self, table, mode, downstream, order_by, after_id, batch_size):
+        if isinstance(table, str):
+            table = getattr(self, table)
+        query = self._build_query(table=table, mode=mode, downstream=downstream)
+        # Unlike `get_sql`, this also returns the query's parameters, which
+        # are named `p1`, `p2` etc. for Postgres
+        sql, arguments, _, _ = query._construct_sql_and_arguments()
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        columns = [getattr(table, name).column for name in order_by or []]
+        order = ", ".join(f'q."{column}"' for column in columns + ["id"])
+        stmt = f"""
+SELECT * FROM ({sql}) q
+WHERE q.id > %(after_id)s
+ORDER BY {order}"""
+        params = {**arguments, "after_id": after_id or 0}
+        yield from self._stream_raw(stmt, batch_size, params=params, named=True)
+
     # @db_session
     def get_records(
-        self, table, mode: RunModes = RunModes.ALL, downstream=None, order_by=None
+        self,
+        table,
+        mode: RunModes = RunModes.ALL,
+        downstream=None,
+        order_by=None,
+        after_id=None,
+        stream: bool = False,
+        batch_size: int = 10_000,
     ):
+        """Records of `table` selected by `mode`.
+
+        With `stream`, rows are read from a server-side cursor `batch_size`
+        at a time and returned as named tuples of column values instead of
+        entities, so memory does not grow with the size of the table.
+        Related entities are then plain IDs."""
+        if stream:
+            yield from self._stream_records(
+                table, mode, downstream, order_by, after_id, batch_size
+            )
+            return
         elems = self._build_query(
-            table=table, mode=mode, downstream=downstream, order_by=order_by
+            table=table,
+            mode=mode,
+            downstream=downstream,
+            order_by=order_by,
+            after_id=after_id,
         )
         try:
             yield from elems
         except TransactionIntegrityError:
-            query = self.db.select(elems.get_sql())
-            yield from query
+            sql, arguments, _, _ = elems._construct_sql_and_arguments()
+            yield from self._stream_raw(sql, params=arguments, named=True)
 
     def get_unique_nodes(self):
         nodes = select((n.cui, n.matched, n.preferred) for n in self.nodes).order_by(
@@ -173,6 +592,64 @@ class Database:
         )
         yield from nodes
 
+    def get_known_cuis(self):
+        """CUIs that already have a concept node."""
+        cuis = select(
+            n.cui_or_name for n in self.nodes if n.node_type == "concept"
+        ).distinct()
+        yield from cuis
+
+    def get_edge_conclusions(self):
+        """Text of every conclusion that predicate edges refer to, joined
+        with its summary and DOI."""
+        query = f"""
+SELECT c.id, c.conclusion, s.summary, a.doi
+FROM {_qualified_name(self.simple_substituted_conclusions)} c
+JOIN {_qualified_name(self.summaries)} s ON s.id = c.summary_id
+JOIN {_qualified_name(self.articles)} a ON a.id = s.article_id
+WHERE c.id IN (
+    SELECT (attributes->>'conclusion_id')::int
+    FROM {_qualified_name(self.edges)}
+    WHERE edge_type = '_VERB'
+)"""
+        columns = ["conclusion_id", "conclusion", "summary", "doi"]
+        for row in self.db.select(query):
+            yield dict(zip(columns, row))
+
+    def get_edges_for_staging(self, batch_size=10_000, restage=False):
+        """Predicate edges joined with the summary and DOI they come from,
+        streamed as plain rows. Edges that are already staged are skipped,
+        unless all of them are `restage`d."""
+        skip_staged = (
+            ""
+            if restage
+            else f"""
+    AND NOT EXISTS (
+        SELECT 1 FROM {_qualified_name(self.predicate_edges)} p
+        WHERE p.edge_id = e.id
+    )"""
+        )
+        query = f"""
+SELECT
+    e.id, e.attributes->>'name', a.doi, s.summary, s.conclusion,
+    e.node_left, e.node_right
+FROM {_qualified_name(self.edges)} e
+JOIN {_qualified_name(self.summaries)} s ON s.id = e.summary_id
+JOIN {_qualified_name(self.articles)} a ON a.id = s.article_id
+WHERE e.edge_type = '_VERB'{skip_staged}
+ORDER BY e.id"""
+        columns = [
+            "edge_id",
+            "name",
+            "doi",
+            "summary",
+            "conclusion",
+            "cui_left",
+            "cui_right",
+        ]
+        for row in self._stream_raw(query, batch_size=batch_size):
+            yield dict(zip(columns, row))
+
     def get_unique_edges(self):
         edges = select(e for e in self.edges)
         yield from edges
@@ -196,6 +673,44 @@ class Database:
         return elems
 
     def _get_newer_records(self, table, downstream):
+        """Records after the watermark of `table` and `downstream`, as a
+        range scan over the (date_added, id) index.
+
+        `date_added` is set by the writer when it creates a row, not when
+        the row is committed. A row committed after a run of the
+        downstream step, but stamped before the last row that run read,
+        is never picked up. NEWER therefore assumes that upstream writes
+        are committed before the downstream step runs, as in the
+        workflow."""
+        watermark = self.get_watermark(table, downstream)
+        if watermark is None:
+            return self._seed_newer_records(table, downstream)
+        date_added, record_id = watermark
+        elems = select(
+            c
+            for c in table
+            if raw_sql('("c"."date_added", "c"."id") > ($date_added, $record_id)')
+        )
+        return elems
+
+    def _seed_newer_records(self, table, downstream):
+        # First run without a watermark, afterwards the run saves one
+        if isinstance(downstream, list):
+            # Records of summaries without rows in any downstream table, as
+            # the downstream rows do not point back to the upstream record
+            summary = getattr(getattr(table, "summary_id", None), "py_type", None)
+            names = [tbl._table_[-1] for tbl in downstream]
+            if summary is None or not all(hasattr(summary, name) for name in names):
+                raise ValueError(
+                    f"No watermark for {table._table_[-1]}. Save one with "
+                    f"`save_watermark` or run mode ALL."
+                )
+            elems = select(c for c in table)
+            for name in names:
+                elems = elems.filter(lambda c: not getattr(c.summary_id, name))
+            return elems
+        # Rows newer than the oldest downstream row, so that existing
+        # deployments do not process everything again
         elems = select(
             c
             for c in table
@@ -203,6 +718,41 @@ class Database:
         )
         return elems
 
+    def get_watermark(self, table, downstream):
+        """`(date_added, id)` of the last `table` record processed for
+        `downstream`, or None."""
+        upstream, downstream = _watermark_key(table, downstream)
+        watermark = select(
+            w
+            for w in self.watermarks
+            if w.upstream == upstream and w.downstream == downstream
+        ).first()
+        if watermark is None:
+            return None
+        return watermark.date_added, watermark.record_id
+
+    def save_watermark(self, table, downstream, date_added, record_id):
+        """Move the watermark of `table` and `downstream` forward to
+        `(date_added, record_id)`, never backwards."""
+        upstream, downstream = _watermark_key(table, downstream)
+        watermarks = _qualified_name(self.watermarks)
+        stmt = f"""
+INSERT INTO {watermarks} AS w
+    (upstream, downstream, date_added, record_id, updated)
+VALUES (%(upstream)s, %(downstream)s, %(date_added)s, %(record_id)s, now())
+ON CONFLICT (upstream, downstream) DO UPDATE SET
+    date_added = EXCLUDED.date_added,
+    record_id = EXCLUDED.record_id,
+    updated = EXCLUDED.updated
+WHERE (w.date_added, w.record_id) < (EXCLUDED.date_added, EXCLUDED.record_id)"""
+        params = {
+            "upstream": upstream,
+            "downstream": downstream,
+            "date_added": date_added,
+            "record_id": record_id,
+        }
+        self._execute_raw(stmt, params=params)
+
     def add_articles(self, data):
         last_id = self._add_record(data, self.articles, periodic_commit=1000)
         return {"article_id": last_id}
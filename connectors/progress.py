@@ -0,0 +1,147 @@
+"""Progress of pipeline runs.
+
+Every run of a pipeline stage has one row in the `progress` table, keyed
+by stage and run ID. It holds the upstream ID below which every record's
+output is committed, the number of rows read and written, and timestamps.
+
+Stages that read ahead of what they write, such as `extract_triples`,
+tag each output with the `upstream_id` of its record, and the writer
+reports those IDs once all of their rows are committed. Until then the
+record is in flight and a resumed run reads it again. Commits that
+report no IDs count every record read so far as written.
+`ProgressTracker` keeps the counters in memory and writes the row from a
+background thread every `interval` seconds, so commits cost nothing
+extra, and once more when the run ends.
+
+It also keeps the highest `(date_added, id)` read, which the pipeline
+saves as the watermark of NEWER mode once the run has finished.
+"""
+
+import threading
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+from utils.logging import PipelineLogger
+
+logger = PipelineLogger("Progress")
+
+
+class ProgressTracker:
+    """Context manager that tracks one run of `stage`.
+
+    ```
+    with ProgressTracker(db, "step_extract_triples") as progress:
+        records = progress.read(db.get_records(...))
+        db.add_record(fn(records), table, progress=progress)
+    ```
+
+    Pass a record from `Database.get_progress` as `resume` to continue its
+    run and counters."""
+
+    def __init__(
+        self,
+        db,
+        stage: str,
+        interval: float = 30.0,
+        resume: Optional[dict] = None,
+    ):
+        self.db = db
+        self.stage = stage
+        self.interval = interval
+        resume = resume or {}
+        self.run_id = resume.get("run_id", datetime.now().isoformat())
+        self.started = resume.get("started", datetime.now())
+        self.upstream_id = resume.get("upstream_id", 0)
+        self.n_read = resume.get("n_read", 0)
+        self.n_written = resume.get("n_written", 0)
+        self.last_written_id = resume.get("last_written_id", 0)
+        self._read_id = self.upstream_id
+        self._in_flight = {}
+        self.watermark = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return (
+            f"ProgressTracker(stage='{self.stage}', run_id='{self.run_id}', "
+            f"n_read={self.n_read}, n_written={self.n_written})"
+        )
+
+    def read(self, records: Iterable) -> Iterator:
+        """Pass upstream records through, counting them."""
+        for record in records:
+            # Raw rows from the `get_records` fallback have no ID
+            id_ = getattr(record, "id", 0)
+            self._read_id = max(self._read_id, id_)
+            with self._lock:
+                self._in_flight[id_] = None
+            date_added = getattr(record, "date_added", None)
+            if date_added is not None:
+                position = (date_added, record.id)
+                if self.watermark is None or position > self.watermark:
+                    self.watermark = position
+            self.n_read += 1
+            yield record
+
+    def checkpoint(
+        self,
+        last_written_id: int,
+        n_rows: int,
+        upstream_ids: Optional[Iterable[int]] = None,
+    ):
+        """Record a commit of `n_rows` rows, in memory only.
+
+        `upstream_ids` are the upstream records whose output is now
+        completely committed. Without them, every record read so far is."""
+        with self._lock:
+            if upstream_ids is None:
+                self._in_flight.clear()
+            else:
+                for id_ in upstream_ids:
+                    self._in_flight.pop(id_, None)
+            if self._in_flight:
+                # Records are read in order of ID, so the first one in flight
+                # is the oldest with uncommitted output
+                self.upstream_id = next(iter(self._in_flight)) - 1
+            else:
+                self.upstream_id = self._read_id
+            self.last_written_id = last_written_id
+            self.n_written += n_rows
+
+    def state(self, finished: Optional[datetime] = None) -> dict:
+        with self._lock:
+            return {
+                "stage": self.stage,
+                "run_id": self.run_id,
+                "upstream_id": self.upstream_id,
+                "n_read": self.n_read,
+                "n_written": self.n_written,
+                "last_written_id": self.last_written_id,
+                "started": self.started,
+                "finished": finished,
+            }
+
+    def _save(self, finished: Optional[datetime] = None):
+        try:
+            self.db.save_progress(self.state(finished))
+        except Exception as e:
+            # Progress is informational, it must never stop a run
+            logger.warning(f"Could not save progress of {self.stage}: {e}")
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._save()
+
+    def __enter__(self):
+        self._save()
+        self._thread = threading.Thread(
+            target=self._run, name=f"progress-{self.stage}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stopped.set()
+        self._thread.join()
+        self._save(finished=datetime.now() if exc_type is None else None)
@@ -34,6 +34,7 @@ class Summary(db.Entity):
     error = Optional(str)
 
     nodes = Set("Node", reverse="summary_id")
+    mentions = Set("Mention", reverse="summary_id")
     edges = Set("Edge", reverse="summary_id")
     simple_conclusions = Set("SimpleConclusions", reverse="summary_id", lazy=False)
     simple_substituted_conclusions = Set(
@@ -52,6 +53,15 @@ class Abbreviation(db.Entity):
     meaning = Required(str)
 
 
+class AbbreviationFrequency(db.Entity):
+    _table_ = (DB_SCHEMA, "abbreviation_frequencies")
+    id = PrimaryKey(int, auto=True)
+    abbreviation = Required(str)
+    meaning = Required(str)
+    frequency = Required(int, default=0)
+    composite_key(abbreviation, meaning)
+
+
 class SimpleConclusions(db.Entity):
     _table_ = (DB_SCHEMA, "simple_conclusions")
     id = PrimaryKey(int, auto=True)
@@ -86,6 +96,13 @@ class Node(db.Entity):
     attributes = Required(Json)
 
 
+class Mention(db.Entity):
+    _table_ = (DB_SCHEMA, "mentions")
+    id = PrimaryKey(int, auto=True)
+    summary_id = Required(Summary, reverse="mentions")
+    cui = Required(str, index=True)
+
+
 class Edge(db.Entity):
     _table_ = (DB_SCHEMA, "edges")
     id = PrimaryKey(int, auto=True)
@@ -96,9 +113,57 @@ class Edge(db.Entity):
     attributes = Required(Json)
 
 
-class Log(db.Entity):
-    _table_ = (DB_SCHEMA, "log")
+class ConceptNode(db.Entity):
+    _table_ = (DB_SCHEMA, "concept_nodes")
+    id = PrimaryKey(int, auto=True)
+    node_id = Required(int)
+    cui = Required(str, unique=True)
+    name = Required(str)
+    date_added = Required(datetime)
+
+
+class SynonymNode(db.Entity):
+    _table_ = (DB_SCHEMA, "synonym_nodes")
+    id = PrimaryKey(int, auto=True)
+    cui = Required(str, index=True)
+    name = Required(str)
+    date_added = Required(datetime)
+
+
+class PredicateEdge(db.Entity):
+    _table_ = (DB_SCHEMA, "predicate_edges")
+    id = PrimaryKey(int, auto=True)
+    edge_id = Required(int, unique=True)
+    name = Required(str)
+    doi = Required(str)
+    summary = Required(str)
+    conclusion = Required(str)
+    cui_left = Required(str)
+    cui_right = Required(str)
+    date_added = Required(datetime)
+
+
+class Watermark(db.Entity):
+    _table_ = (DB_SCHEMA, "watermarks")
+    id = PrimaryKey(int, auto=True)
+    upstream = Required(str)
+    downstream = Required(str)
+    date_added = Required(datetime)
+    record_id = Required(int)
+    updated = Required(datetime)
+    composite_key(upstream, downstream)
+
+
+class Progress(db.Entity):
+    _table_ = (DB_SCHEMA, "progress")
     id = PrimaryKey(int, auto=True)
-    table = Required(str)
-    last_processed = Required(int)
-    timestamp = Required(datetime)
+    stage = Required(str)
+    run_id = Required(str)
+    upstream_id = Required(int, default=0)
+    n_read = Required(int, default=0)
+    n_written = Required(int, default=0)
+    last_written_id = Required(int, default=0)
+    started = Required(datetime)
+    updated = Required(datetime)
+    finished = Optional(datetime)
+    composite_key(stage, run_id)
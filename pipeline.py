@@ -1,5 +1,5 @@
 from typing import Callable, Generator, Optional, Dict, List
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from enum import Enum
 
 from tqdm import tqdm
@@ -7,6 +7,7 @@ from pony.orm import db_session  # TODO: factor out somehow
 
 from utils.run_modes import RunModes
 from utils.logging import PipelineLogger
+from connectors.progress import ProgressTracker
 
 from custom_types import Records
 
@@ -22,9 +23,15 @@ class PipelineStep:
         downstream: Optional["db.Entity"] = None,
         name: str = None,
         func_args: dict = {},
+        bulk_write: bool = False,
+        progress_interval: float = 30.0,
+        stream_reads: bool = False,
     ):
         self.fn = fn
         self.func_args = func_args
+        self.bulk_write = bulk_write
+        self.progress_interval = progress_interval
+        self.stream_reads = stream_reads
         self.db = db
         if (upstream or downstream) and not self.db:
             raise AttributeError(
@@ -65,6 +72,8 @@ class PipelineStep:
         order_by: Optional[str] = None,
         write: bool = True,
         duplicates: str = "raise",
+        progress: Optional[ProgressTracker] = None,
+        after_id: Optional[int] = None,
     ) -> Generator:
         if write and not self.downstream:
             raise AttributeError(
@@ -78,7 +87,11 @@ class PipelineStep:
                     mode=mode,
                     downstream=self.downstream,
                     order_by=order_by,
+                    after_id=after_id,
+                    stream=self.stream_reads,
                 )
+                if progress is not None:
+                    all_data = progress.read(all_data)
             yield from run(all_data)
             # yield from run(all_data)
 
@@ -95,7 +108,11 @@ class PipelineStep:
             if write:
                 for elem in result:
                     id_ = self.db.add_record(
-                        data=result, table=self.downstream, duplicates=duplicates
+                        data=result,
+                        table=self.downstream,
+                        duplicates=duplicates,
+                        bulk=self.bulk_write,
+                        progress=progress,
                     )
                     elem.update({"id": id_})
                     yield elem
@@ -113,25 +130,64 @@ class PipelineStep:
         mode: RunModes = RunModes.ALL,
         order_by: str = None,
         duplicates: str = "raise",
+        resume: bool = False,
     ) -> Generator[dict, None, None]:
+        """Run the step on the upstream records selected by `mode`.
+
+        Runs that write are tracked in the `progress` table and read the
+        upstream table in order of ID. With `resume`, an unfinished previous
+        run of this step is continued after the last upstream ID whose output
+        it had committed, see `connectors.progress`. A finished run moves the
+        watermark that NEWER mode reads from past every upstream record it
+        has read."""
         if not isinstance(mode, RunModes):
             try:
                 mode = RunModes[mode.upper()]
             except KeyError:
                 msg = f"Unknown mode '{mode}'. Allowed values are {', '.join(RunModes.__members__.keys())}"
                 raise KeyError(msg)
+        if write and order_by not in (None, "id"):
+            if resume:
+                raise ValueError("Only runs ordered by 'id' can be resumed.")
+        elif write:
+            order_by = "id"
         with self.db.session_handler():
+            resumed = self.db.get_progress(self.name) if resume else None
+            if resumed is not None and resumed["finished"] is not None:
+                resumed = None
+            if resumed is not None:
+                logger.info(
+                    f"Resuming run {resumed['run_id']} of {self.name} after "
+                    f"upstream ID {resumed['upstream_id']}."
+                )
             try:
                 n_elems = self._count_upstream_rows(mode=mode)
             except AttributeError as e:
                 logger.warning("Unable to count processable rows: %s" % e)
                 n_elems = None
-            with self.runner(
-                write=write, mode=mode, order_by=order_by, duplicates=duplicates
+            tracker = nullcontext()
+            if write:
+                tracker = ProgressTracker(
+                    self.db,
+                    self.name,
+                    interval=self.progress_interval,
+                    resume=resumed,
+                )
+            with tracker as progress, self.runner(
+                write=write,
+                mode=mode,
+                order_by=order_by,
+                duplicates=duplicates,
+                progress=progress,
+                after_id=resumed["upstream_id"] if resumed else None,
             ) as run:
                 # result = run()
                 for elem in tqdm(run(), total=n_elems, desc=self.name):
                     yield elem
+            if write and progress.watermark is not None:
+                self.db.save_watermark(
+                    self.upstream, self.downstream, *progress.watermark
+                )
 
     def run_once(self, id: int, write: bool = True):
 
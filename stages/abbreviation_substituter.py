@@ -1,12 +1,57 @@
 import re
 from datetime import datetime
-from typing import List, Generator, Dict
+from typing import List, Generator, Dict, Iterable, Optional, Tuple
 
 from utils.logging import PipelineLogger
 from custom_types import Records, RawRecords
 
 logger = PipelineLogger("SubstituteTask")
 
+_TOKEN_PATTERN = re.compile(r"\b\w[\w\-]*\b")
+
+
+class AbbreviationDictionary:
+    """In-memory corpus-wide lookup from abbreviation to its most frequent
+    meaning, used for abbreviations that an article does not define itself.
+
+    Fed with (abbreviation, meaning) pairs ordered by descending frequency,
+    e.g. from `Database.get_abbreviation_meanings`."""
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]] = ()):
+        self._meanings: Dict[str, str] = {}
+        self.update(pairs)
+
+    def __len__(self) -> int:
+        return len(self._meanings)
+
+    def __contains__(self, abbreviation: str) -> bool:
+        return abbreviation in self._meanings
+
+    def update(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        for abbreviation, meaning in pairs:
+            # Only accept short forms that cannot be confused with a
+            # capitalized word at the start of a sentence.
+            if sum(char.isupper() for char in abbreviation) < 2:
+                continue
+            self._meanings.setdefault(abbreviation, meaning)
+
+    def lookup(self, token: str) -> Optional[str]:
+        meaning = self._meanings.get(token)
+        if meaning is None and token.endswith("s"):
+            meaning = self._meanings.get(token[:-1])
+        return meaning
+
+    def substitute(self, sentence: str, exclude: Iterable[str] = ()) -> str:
+        exclude = set(exclude)
+
+        def _replace(match: re.Match) -> str:
+            token = match.group(0)
+            if token in exclude:
+                return token
+            return self.lookup(token) or token
+
+        return _TOKEN_PATTERN.sub(_replace, sentence)
+
 
 def _substitute_word(sentence: str, abbreviation: str) -> str:
     try:
@@ -36,20 +81,30 @@ def _substitute_word(sentence: str, abbreviation: str) -> str:
     return substituted
 
 
-def substitute(sentence: str, abbrevs: List[str]) -> str:
+def substitute(
+    sentence: str,
+    abbrevs: List[str],
+    abbreviation_dictionary: Optional[AbbreviationDictionary] = None,
+) -> str:
     for abbreviation in abbrevs:
         sentence = _substitute_word(sentence, abbreviation)
+    if abbreviation_dictionary is not None:
+        sentence = abbreviation_dictionary.substitute(
+            sentence,
+            exclude=[abbreviation.abbreviation for abbreviation in abbrevs],
+        )
     return sentence
 
 
 def substitute_abbreviations(
     simple_conclusions: Records,
+    abbreviation_dictionary: Optional[AbbreviationDictionary] = None,
 ) -> RawRecords:
     for simple_conclusion in simple_conclusions:
         abbrevs = simple_conclusion.summary_id.abbreviations
         abbrevs = list(abbrevs)
         sentence = simple_conclusion.conclusion
-        substituted_sentence = substitute(sentence, abbrevs)
+        substituted_sentence = substitute(sentence, abbrevs, abbreviation_dictionary)
         yield {
             "simple_conclusion_id": simple_conclusion.id,
             "summary_id": simple_conclusion.summary_id.id,
@@ -0,0 +1,140 @@
+"""Persistent key-value cache for expensive per-text pipeline results.
+
+Entries live in a local SQLite file so they survive across runs. Lookups
+and inserts work on whole batches, and the least recently used entries
+are evicted, somewhat below `max_entries`, once the cache grows beyond it.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Union
+
+from more_itertools import chunked
+
+# SQLite limits the number of host parameters per statement
+_MAX_PARAMS: int = 900
+
+# Eviction goes this share of `max_entries` below the limit, so that the
+# cache is not recounted and pruned again on the next insert
+_EVICT_SHARE: float = 0.1
+
+
+def cache_key(*parts: str) -> str:
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class PersistentCache:
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_entries: int = 1_000_000,
+        dumps: Callable[[Any], Union[str, bytes]] = json.dumps,
+        loads: Callable[[Union[str, bytes]], Any] = json.loads,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.dumps = dumps
+        self.loads = loads
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = sqlite3.connect(str(self.path))
+        self._connection.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used);
+            """
+        )
+        # Running count, so that inserts do not have to count the table.
+        # Entries that other processes add are seen when it is refreshed
+        # before evicting.
+        self._n_entries = len(self)
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT count(*) FROM cache").fetchone()[0]
+
+    def __repr__(self):
+        return f"PersistentCache(path='{self.path}', max_entries={self.max_entries})"
+
+    @property
+    def stats(self) -> Dict[str, Union[int, float]]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for chunk in chunked(keys, _MAX_PARAMS):
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self._connection.execute(
+                f"SELECT key, value FROM cache WHERE key IN ({placeholders})", chunk
+            )
+            found.update((key, self.loads(value)) for key, value in rows)
+        if found:
+            now = time.time()
+            with self._connection:
+                self._connection.executemany(
+                    "UPDATE cache SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def put_many(self, items: Dict[str, Any]):
+        if not items:
+            return
+        now = time.time()
+        n_existing = 0
+        with self._connection:
+            for chunk in chunked(items, _MAX_PARAMS):
+                placeholders = ", ".join("?" * len(chunk))
+                n_existing += self._connection.execute(
+                    f"SELECT count(*) FROM cache WHERE key IN ({placeholders})", chunk
+                ).fetchone()[0]
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, last_used) VALUES (?, ?, ?)",
+                [(key, self.dumps(value), now) for key, value in items.items()],
+            )
+        self._n_entries += len(items) - n_existing
+        if self._n_entries > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        self._n_entries = len(self)
+        if self._n_entries <= self.max_entries:
+            return
+        low_water = self.max_entries - int(self.max_entries * _EVICT_SHARE)
+        excess = self._n_entries - low_water
+        with self._connection:
+            self._connection.execute(
+                """DELETE FROM cache WHERE key IN (
+                    SELECT key FROM cache ORDER BY last_used LIMIT ?
+                )""",
+                (excess,),
+            )
+        self._n_entries -= excess
+        self.evictions += excess
+        logging.debug("Evicted %s entries from %s" % (excess, self))
+
+    def close(self):
+        self._connection.close()
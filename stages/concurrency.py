@@ -0,0 +1,104 @@
+"""Bounded-concurrency scheduling for async pipeline calls.
+
+`sliding_window` keeps up to `concurrency` calls in flight and starts a
+new one as soon as any call finishes, so a single slow input no longer
+holds back the rest of its batch. Results are streamed out in completion
+order together with their input index; `restore_order` puts them back
+into input order when the caller needs it.
+"""
+
+import asyncio
+from itertools import islice
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    NamedTuple,
+    Optional,
+)
+
+
+class ScheduledResult(NamedTuple):
+    index: int
+    item: Any
+    result: Any  # return value or the exception raised by the call
+
+
+async def _timed(call: Awaitable, timeout: Optional[float]):
+    if timeout is None:
+        return await call
+    return await asyncio.wait_for(call, timeout=timeout)
+
+
+async def sliding_window(
+    fn: Callable[[Any], Awaitable],
+    items: Iterable,
+    concurrency: int = 20,
+    timeout: Optional[float] = None,
+) -> AsyncGenerator[ScheduledResult, None]:
+    """Apply `fn` to every item with at most `concurrency` calls running.
+
+    Calls that exceed `timeout` seconds are cancelled and reported with an
+    `asyncio.TimeoutError` as result. Closing the generator early cancels
+    all calls still in flight."""
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1.")
+    items = enumerate(items)
+    in_flight: Dict[asyncio.Future, tuple] = {}
+
+    def _submit(n: int):
+        for index, item in islice(items, n):
+            task = asyncio.ensure_future(_timed(fn(item), timeout))
+            in_flight[task] = (index, item)
+
+    _submit(concurrency)
+    try:
+        while in_flight:
+            done, _ = await asyncio.wait(
+                in_flight.keys(), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                index, item = in_flight.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    result = e
+                yield ScheduledResult(index, item, result)
+            _submit(concurrency - len(in_flight))
+    finally:
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+
+def restore_order(
+    results: Iterable[ScheduledResult],
+) -> Generator[ScheduledResult, None, None]:
+    """Re-emit streamed results in input order, holding back only those
+    that finished ahead of a slower predecessor."""
+    pending: Dict[int, ScheduledResult] = {}
+    next_index = 0
+    for scheduled in results:
+        pending[scheduled.index] = scheduled
+        while next_index in pending:
+            yield pending.pop(next_index)
+            next_index += 1
+
+
+def iterate_in_loop(
+    loop: asyncio.AbstractEventLoop, agen: AsyncGenerator
+) -> Generator[Any, None, None]:
+    """Drive an async generator from synchronous code, one item at a time."""
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(agen.aclose())
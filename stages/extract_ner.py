@@ -5,14 +5,22 @@ import os
 import re
 import json
 import time
+import signal
 import more_itertools
 import asyncio
+import functools
+import itertools
 from itertools import groupby
 
 import requests
 
 from pony.orm import db_session
 
+from .metamap import MetaMapPool, METAMAP_VERSION
+from .concurrency import sliding_window, restore_order, iterate_in_loop
+from .metamaplite import MetaMapLiteClient
+from .cache import PersistentCache, cache_key
+
 
 def _parse_online(text):
     time.sleep(0.2)
@@ -25,6 +33,10 @@ def _parse_online(text):
     }
     response = requests.post(url, payload, headers=headers)
     data = response.json()
+    return _to_named_entities(data)
+
+
+def _to_named_entities(data):
     named_entities = {
         item["matchedtext"]: [
             {
@@ -38,28 +50,49 @@ def _parse_online(text):
     return named_entities
 
 
+def _prepare_text(text):
+    for exclude in ["conclusions", "conclusion"]:
+        if text.lower().startswith(exclude):
+            text = text[len(exclude) :]
+
+    text = text.encode("ascii", "ignore").decode("ascii")
+    # Blank lines separate documents on the MetaMap input stream
+    text = " ".join(text.split())
+    return text
+
+
+def _to_phrases(data):
+    return data["AllDocuments"][0]["Document"]["Utterances"][0]["Phrases"]
+
+
 async def _metamap_call(record):
     metamap_path = os.getenv("METAMAP_PATH")
     version_cmd = ""
-    metamap_version = "2018AB"
+    metamap_version = METAMAP_VERSION
     cmd = 'echo "%s" | %s/bin/metamap --lexicon db -Z 2018AB -I --JSONn'  # f 4'
     # text = record.get("conclusion")
-    text = record.conclusion
+    text = _prepare_text(record.conclusion)
     summary_id = record.id
-    for exclude in ["conclusions", "conclusion"]:
-        if text.lower().startswith(exclude):
-            text = text[len(exclude) :]
-
-    text = text.encode("ascii", "ignore").decode("ascii")
     text = text.replace("'", "")  # "\\'")
 
     proc = await asyncio.create_subprocess_shell(
         cmd % (text, metamap_path),
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
 
-    stdout, stderr = await proc.communicate()
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # Timed out in `sliding_window`. MetaMap runs as a child of the
+        # shell, so the whole process group is killed.
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        raise
     if proc.returncode:
         logging.error("Metamap error: %s" % stderr.decode("utf-8"))
         raise ValueError("Metamap error: %s" % stderr.decode("utf-8"))
@@ -78,11 +111,20 @@ async def _metamap_call(record):
         raise ValueError("Invalid metamap output: %s" % json_txt)
     except ValueError:
         raise ValueError("Could not parse metamap output: %s" % stdout.decode("utf8"))
-    phrases = data["AllDocuments"][0]["Document"]["Utterances"][0]["Phrases"]
+    phrases = _to_phrases(data)
     named_entities = [ne for ne in to_ner(phrases, summary_id, metamap_version)]
     return named_entities
 
 
+async def _pooled_call(pool, records):
+    texts = [_prepare_text(record.conclusion) for record in records]
+    documents = await pool.annotate(texts)
+    return [
+        list(to_ner(_to_phrases(document), record.id, METAMAP_VERSION))
+        for record, document in zip(records, documents)
+    ]
+
+
 def to_ner(phrases, summary_id, metamap_version):
     for item in phrases:
         if not item["Mappings"]:
@@ -100,31 +142,215 @@ def to_ner(phrases, summary_id, metamap_version):
             yield named_entity
 
 
-async def _collect_output(conclusions):
-    data = await asyncio.gather(
-        *[_metamap_call(record) for record in conclusions], return_exceptions=True
+def _iterate_results(loop, results, ordered=False):
+    results = iterate_in_loop(loop, results)
+    if ordered:
+        results = restore_order(results)
+    for scheduled in results:
+        if isinstance(scheduled.result, Exception):
+            logging.error("MetaMap call failed: %r" % scheduled.result)
+            continue
+        yield scheduled
+
+
+def _cache_key(text, metamap_version=METAMAP_VERSION):
+    return cache_key(metamap_version, _prepare_text(text).strip())
+
+
+def _lookup_cached(conclusions, cache, batch_size):
+    """Pair every record with its cache key and cached named entities
+    (None on a miss), looking records up one batch at a time."""
+    for batch in more_itertools.chunked(conclusions, batch_size):
+        if cache is None:
+            yield [(record, None, None) for record in batch]
+            continue
+        keys = [_cache_key(record.conclusion) for record in batch]
+        cached = cache.get_many(keys)
+        yield [(record, key, cached.get(key)) for record, key in zip(batch, keys)]
+
+
+def _from_cache(named_entities, summary_id):
+    return [dict(ne, ss_conclusion_id=summary_id) for ne in named_entities]
+
+
+def _to_cache(named_entities):
+    return [
+        {k: v for k, v in ne.items() if k != "ss_conclusion_id"}
+        for ne in named_entities
+    ]
+
+
+async def _cached_call(item):
+    record, _, cached = item
+    if cached is not None:
+        return _from_cache(cached, record.id)
+    return await _metamap_call(record)
+
+
+async def _pooled_cached_call(pool, items):
+    misses = [record for record, _, cached in items if cached is None]
+    annotated = iter(await _pooled_call(pool, misses) if misses else [])
+    return [
+        _from_cache(cached, record.id) if cached is not None else next(annotated)
+        for record, _, cached in items
+    ]
+
+
+class _CacheWriter:
+    def __init__(self, cache, batch_size):
+        self.cache = cache
+        self.batch_size = batch_size
+        self.pending = {}
+
+    def add(self, item, named_entities):
+        _, key, cached = item
+        if self.cache is None or cached is not None:
+            return
+        self.pending[key] = _to_cache(named_entities)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.cache is not None:
+            self.cache.put_many(self.pending)
+        self.pending = {}
+
+
+def _parse_with_pool(
+    conclusions,
+    batch_size=20,
+    pool_size=4,
+    timeout=None,
+    ordered=False,
+    cache=None,
+):
+    loop = asyncio.new_event_loop()
+    pool = MetaMapPool(size=pool_size)
+    loop.run_until_complete(pool.start())
+    writer = _CacheWriter(cache, batch_size)
+    try:
+        results = sliding_window(
+            functools.partial(_pooled_cached_call, pool),
+            _lookup_cached(conclusions, cache, batch_size),
+            concurrency=pool_size,
+            timeout=timeout,
+        )
+        for scheduled in _iterate_results(loop, results, ordered):
+            for item, result in zip(scheduled.item, scheduled.result):
+                writer.add(item, result)
+                yield from result
+    finally:
+        writer.flush()
+        loop.run_until_complete(pool.close())
+        loop.close()
+
+
+def _open_cache(cache_path, max_cache_entries):
+    cache_path = cache_path or os.getenv("NER_CACHE_PATH")
+    if not cache_path:
+        return None
+    return PersistentCache(cache_path, max_entries=max_cache_entries)
+
+
+def _parse_locally(
+    conclusions,
+    batch_size=20,
+    pool_size=None,
+    concurrency=None,
+    timeout=300,
+    ordered=False,
+    cache_path=None,
+    max_cache_entries=1_000_000,
+):
+    """Run MetaMap over all conclusions with a fixed number of calls in
+    flight (`concurrency`, defaults to `batch_size`). Results are streamed
+    as they finish, pass `ordered=True` to get them in input order.
+
+    With a `cache_path` (or `$NER_CACHE_PATH`), results are cached per
+    normalized text and MetaMap version, and only misses reach MetaMap."""
+    cache = _open_cache(cache_path, max_cache_entries)
+    try:
+        if pool_size:
+            yield from _parse_with_pool(
+                conclusions,
+                batch_size,
+                pool_size,
+                timeout=timeout,
+                ordered=ordered,
+                cache=cache,
+            )
+            return
+        yield from _parse_unpooled(
+            conclusions, batch_size, concurrency, timeout, ordered, cache
+        )
+    finally:
+        if cache is not None:
+            logging.info("NER cache statistics: %s" % cache.stats)
+            cache.close()
+
+
+def _parse_unpooled(conclusions, batch_size, concurrency, timeout, ordered, cache):
+    loop = asyncio.new_event_loop()
+    writer = _CacheWriter(cache, batch_size)
+    results = sliding_window(
+        _cached_call,
+        itertools.chain.from_iterable(_lookup_cached(conclusions, cache, batch_size)),
+        concurrency=concurrency or batch_size,
+        timeout=timeout,
     )
-    return data
+    try:
+        for scheduled in _iterate_results(loop, results, ordered):
+            writer.add(scheduled.item, scheduled.result)
+            yield from scheduled.result
+    finally:
+        writer.flush()
+        loop.close()
 
 
-def _parse_locally(conclusions, batch_size=20):
-    loop = asyncio.get_event_loop()
-    for batch in more_itertools.ichunked(conclusions, batch_size):
+def _online_to_ner(named_entities, summary_id):
+    for matched_term, concepts in named_entities.items():
+        for concept in concepts:
+            yield {
+                "ss_conclusion_id": summary_id,
+                "matched_term": matched_term,
+                "preferred_term": concept["name"],
+                "cui": concept["cui"],
+                "metamap_version": "metamaplite",
+            }
+
 
-        results = loop.run_until_complete(_collect_output(batch))
-        print(results)
-        for result in results:
-            if not result:
-                continue
-            if isinstance(result, Exception):
-                continue
-            yield from result
-    loop.close()
+def _parse_online_pooled(conclusions, concurrency=10, ordered=False, **client_args):
+    """Annotate conclusions with the MetaMapLite REST API over a pooled,
+    rate-limited connection. `client_args` are passed on to
+    `MetaMapLiteClient`, e.g. `rate` and `burst`."""
+    loop = asyncio.new_event_loop()
+    client = MetaMapLiteClient(**client_args)
+    loop.run_until_complete(client.open())
+
+    async def annotate(record):
+        return await client.annotate(_prepare_text(record.conclusion))
+
+    try:
+        results = sliding_window(annotate, conclusions, concurrency=concurrency)
+        for scheduled in _iterate_results(loop, results, ordered):
+            named_entities = _to_named_entities(scheduled.result)
+            yield from _online_to_ner(named_entities, scheduled.item.id)
+    finally:
+        loop.run_until_complete(client.close())
+        loop.close()
 
 
 # @db_session
-def recognize_named_entities(sentences, parser="local"):
-    """Extract MeSH terms from text."""
-    parsers = {"local": _parse_locally, "web": _parse_online}
+def recognize_named_entities(sentences, parser="local", **parser_args):
+    """Extract MeSH terms from text.
+
+    Pass `pool_size` to the local parser to keep that many MetaMap
+    processes running instead of starting one per sentence. The
+    `web_async` parser queries MetaMapLite over pooled connections."""
+    parsers = {
+        "local": _parse_locally,
+        "web": _parse_online,
+        "web_async": _parse_online_pooled,
+    }
     parser = parsers[parser]
-    yield from parser(sentences)
+    yield from parser(sentences, **parser_args)
@@ -85,6 +85,25 @@ class SynonymNodeIF(GraphDBInterface):
         return data
 
 
+class ConclusionNodeIF(GraphDBInterface):
+    def __init__(self):
+        self.name = "Conclusion node"
+        self.stmt = f"""
+    MERGE (a:conclusion {{conclusion_id: toInteger(row.conclusion_id)}})
+        SET a.doi = row.doi
+        SET a.conclusion = row.conclusion
+        SET a.summary = row.summary
+        SET a.date_added = date("{_load_date()}")
+        SET a.version = row.version
+    RETURN
+        count(a)
+        """
+        self.columns = ["conclusion_id", "doi", "conclusion", "summary", "version"]
+
+    def format_data(self, record) -> dict:
+        return {**record, "version": GIT_VERSION}
+
+
 class PredicateEdgeIF(GraphDBInterface):
     def __init__(self):
         self.name = "Predicate edge"
@@ -98,10 +117,8 @@ class PredicateEdgeIF(GraphDBInterface):
         b.cui = row.cui_left AND 
         a.cui = row.cui_right
     MERGE 
-        (a)-[r:{self.label} {{doi:row.doi}}]->(b)
-        SET r.name = row.name
-        SET r.summary = row.summary
-        SET r.conclusion = row.conclusion
+        (a)-[r:{self.label} {{doi:row.doi, name:row.name}}]->(b)
+        SET r.conclusion_id = toInteger(row.conclusion_id)
         SET r.predicate = row.predicate
         SET r.date_added = date("{_load_date()}")
         SET r.version = row.version
@@ -111,8 +128,7 @@ class PredicateEdgeIF(GraphDBInterface):
         """
         self.columns = [
             "name",
-            "conclusion",
-            "summary",
+            "conclusion_id",
             "doi",
             "predicate",
             "cui_left",
@@ -124,8 +140,7 @@ class PredicateEdgeIF(GraphDBInterface):
         attr = record.attributes
         data = {
             "name": attr["name"],
-            "conclusion": attr["conclusion"],
-            "summary": attr["summary"],
+            "conclusion_id": attr.get("conclusion_id"),
             "doi": attr["doi"],
             "predicate": attr["name"],
             "cui_left": record.node_left,
@@ -190,7 +205,7 @@ class GraphWriter:
     def _add_elems(self, db_interface, records, write=False, batch_size=5000):
         with self.db.session_handler():
             source_table = db_interface.source_table
-            records = self.db.get_records(source_table)
+            records = self.db.get_records(source_table, stream=True)
             self.batch_load(
                 db_interface=db_interface,
                 data=records,
@@ -198,10 +213,22 @@ class GraphWriter:
                 batch_size=batch_size,
             )
 
+    def add_conclusions(self, write=False, batch_size=10_000):
+        """Conclusion and summary text, stored once per conclusion node
+        instead of on every predicate edge."""
+        with self.db.session_handler():
+            self.batch_load(
+                db_interface=ConclusionNodeIF(),
+                data=self.db.get_edge_conclusions(),
+                write=write,
+                batch_size=batch_size,
+            )
+
     def add_edges(self, write=False, batch_size=10_000):
         interfaces = {"_VERB": PredicateEdgeIF, "_REL": RelationalEdgeIF}
+        self.add_conclusions(write=write, batch_size=batch_size)
         with self.db.session_handler():
-            records = self.db.get_records("edges", order_by="edge_type")
+            records = self.db.get_records("edges", order_by="edge_type", stream=True)
             for group, recs in groupby(records, key=lambda x: x.edge_type):
                 interface = interfaces[group]()
                 self.batch_load(
@@ -215,7 +242,7 @@ class GraphWriter:
     def add_nodes(self, write=False, batch_size=10_000):
         interfaces = {"concept": ConceptNodeIF, "synonym": SynonymNodeIF}
         with self.db.session_handler():
-            records = self.db.get_records("nodes", order_by="node_type")
+            records = self.db.get_records("nodes", order_by="node_type", stream=True)
             for group, recs in groupby(records, key=lambda x: x.node_type):
                 interface = interfaces[group]()
                 self.batch_load(
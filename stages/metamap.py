@@ -0,0 +1,248 @@
+"""Pool of long-lived MetaMap processes.
+
+Every worker keeps one MetaMap process open and feeds it batches of
+documents over stdin, separated by blank lines. The JSON output is parsed
+incrementally from stdout, one `AllDocuments` object per input document,
+so the JVM/Prolog start-up cost is paid once per worker instead of once
+per sentence.
+"""
+
+import os
+import json
+import codecs
+import logging
+import asyncio
+from collections import deque
+from typing import List, Optional, Sequence
+
+METAMAP_VERSION: str = "2018AB"
+METAMAP_ARGS: List[str] = ["--lexicon", "db", "-Z", METAMAP_VERSION, "-I", "--JSONn"]
+
+
+class MetaMapError(IOError):
+    pass
+
+
+class MetaMapWorker:
+    def __init__(self, cmd: Sequence[str], timeout: float = 60, name: str = "0"):
+        self.cmd = list(cmd)
+        self.timeout = timeout
+        self.name = name
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self._killed = False
+        self.n_processed = 0
+        self._buffer = ""
+        self._decoder = None
+        self._json = json.JSONDecoder()
+        self._stderr = deque(maxlen=50)
+        self._stderr_task = None
+
+    def __repr__(self):
+        return f"MetaMapWorker(name='{self.name}', alive={self.is_alive()})"
+
+    def is_alive(self) -> bool:
+        return (
+            self.proc is not None and self.proc.returncode is None and not self._killed
+        )
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._buffer = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._stderr_task = asyncio.ensure_future(self._drain_stderr())
+        logging.debug("Started MetaMap worker %s (pid %s)" % (self.name, self.proc.pid))
+
+    def kill(self):
+        if self.proc is None or self.proc.returncode is not None:
+            return
+        try:
+            self.proc.kill()
+        except ProcessLookupError:
+            pass
+        self._killed = True
+
+    async def stop(self):
+        if self.proc is None:
+            return
+        if self.is_alive():
+            try:
+                self.proc.stdin.close()
+                await asyncio.wait_for(self.proc.wait(), timeout=5)
+            except (asyncio.TimeoutError, BrokenPipeError, ConnectionResetError):
+                self.kill()
+        await self.proc.wait()
+        if self._stderr_task is not None:
+            self._stderr_task.cancel()
+        self.proc = None
+        self._killed = False
+
+    async def restart(self):
+        await self.stop()
+        await self.start()
+
+    async def _drain_stderr(self):
+        # MetaMap can block on a full stderr pipe, keep the tail for errors.
+        while True:
+            line = await self.proc.stderr.readline()
+            if not line:
+                break
+            self._stderr.append(line.decode("utf-8", "replace").rstrip())
+
+    @property
+    def stderr(self) -> str:
+        return "\n".join(self._stderr)
+
+    async def _read_document(self) -> dict:
+        while True:
+            start = self._buffer.find("{")
+            if start >= 0:
+                try:
+                    document, end = self._json.raw_decode(self._buffer, start)
+                except json.JSONDecodeError:
+                    pass
+                else:
+                    self._buffer = self._buffer[end:]
+                    return document
+            chunk = await self.proc.stdout.read(65536)
+            if not chunk:
+                raise MetaMapError(
+                    "MetaMap worker %s exited unexpectedly: %s"
+                    % (self.name, self.stderr)
+                )
+            self._buffer += self._decoder.decode(chunk)
+
+    async def _process(self, texts: List[str]) -> List[dict]:
+        payload = "".join(f"{text}\n\n" for text in texts)
+        self.proc.stdin.write(payload.encode("utf-8"))
+        await self.proc.stdin.drain()
+        documents = []
+        for _ in texts:
+            document = await self._read_document()
+            if not document.get("AllDocuments"):
+                raise MetaMapError(
+                    "Empty MetaMap output, is the tagger/WSD server running?"
+                )
+            documents.append(document)
+        self.n_processed += len(texts)
+        return documents
+
+    async def process(self, texts: List[str]) -> List[dict]:
+        if not self.is_alive():
+            raise MetaMapError("MetaMap worker %s is not running." % self.name)
+        try:
+            return await asyncio.wait_for(self._process(texts), timeout=self.timeout)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise MetaMapError(
+                "Lost connection to MetaMap worker %s: %s" % (self.name, e)
+            )
+
+    async def health_check(self) -> bool:
+        try:
+            await self.process(["Health check."])
+        except (MetaMapError, asyncio.TimeoutError) as e:
+            logging.warning(
+                "MetaMap worker %s failed health check: %s" % (self.name, e)
+            )
+            return False
+        return True
+
+
+class MetaMapPool:
+    """Fixed-size pool of `MetaMapWorker`s.
+
+    Use as an async context manager:
+
+    ```
+    async with MetaMapPool(size=4) as pool:
+        documents = await pool.annotate(["First text.", "Second text."])
+    ```
+
+    A worker that dies, times out or fails its health check is restarted
+    and the batch is retried, up to `max_restarts` times per batch.
+    """
+
+    def __init__(
+        self,
+        metamap_path: Optional[str] = None,
+        size: int = 4,
+        timeout: float = 60,
+        max_restarts: int = 2,
+        cmd: Optional[Sequence[str]] = None,
+    ):
+        if cmd is None:
+            metamap_path = metamap_path or os.getenv("METAMAP_PATH")
+            cmd = [os.path.join(metamap_path, "bin", "metamap")] + METAMAP_ARGS
+        self.cmd = list(cmd)
+        self.size = size
+        self.timeout = timeout
+        self.max_restarts = max_restarts
+        self.n_restarts = 0
+        self.workers: List[MetaMapWorker] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def start(self):
+        self._idle = asyncio.Queue()
+        self.workers = [
+            MetaMapWorker(self.cmd, timeout=self.timeout, name=str(i))
+            for i in range(self.size)
+        ]
+        await asyncio.gather(*[worker.start() for worker in self.workers])
+        for worker in self.workers:
+            if not await worker.health_check():
+                await self.close()
+                raise MetaMapError(
+                    "MetaMap worker %s is unhealthy: %s" % (worker.name, worker.stderr)
+                )
+            self._idle.put_nowait(worker)
+        logging.info("Started %s MetaMap workers." % self.size)
+
+    async def close(self):
+        await asyncio.gather(*[worker.stop() for worker in self.workers])
+        self.workers = []
+
+    async def _restart(self, worker: MetaMapWorker):
+        self.n_restarts += 1
+        logging.warning("Restarting MetaMap worker %s." % worker.name)
+        await worker.restart()
+        if not await worker.health_check():
+            raise MetaMapError(
+                "MetaMap worker %s did not recover: %s" % (worker.name, worker.stderr)
+            )
+
+    async def annotate(self, texts: List[str]) -> List[dict]:
+        """Run a batch of documents through the next idle worker and return
+        one MetaMap JSON document per text, in input order."""
+        worker = await self._idle.get()
+        try:
+            for attempt in range(self.max_restarts + 1):
+                if not worker.is_alive():
+                    await self._restart(worker)
+                try:
+                    return await worker.process(texts)
+                except (MetaMapError, asyncio.TimeoutError) as e:
+                    if attempt == self.max_restarts:
+                        raise MetaMapError(
+                            "MetaMap batch failed after %s restarts: %s"
+                            % (self.max_restarts, e)
+                        )
+                    # Output of a failed batch cannot be realigned with its
+                    # input, so the worker is restarted from a clean state.
+                    await self._restart(worker)
+        except asyncio.CancelledError:
+            # Cancelled mid-batch, the next caller gets a fresh process.
+            worker.kill()
+            raise
+        finally:
+            self._idle.put_nowait(worker)
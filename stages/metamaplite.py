@@ -0,0 +1,157 @@
+"""Async client for the MetaMapLite REST annotator.
+
+Requests share one keep-alive connection pool and are paced by a token
+bucket, so throughput follows the server's rate limit instead of a fixed
+sleep per request. Responses with status 429 or 5xx are retried with
+exponential backoff, honouring `Retry-After` when the server sends it.
+"""
+
+import time
+import random
+import asyncio
+import logging
+from typing import List, Optional
+
+import aiohttp
+
+from .concurrency import sliding_window, restore_order
+
+METAMAPLITE_URL: str = "https://ii-public1.nlm.nih.gov/metamaplite/rest/annotate"
+# Requests per second and burst size allowed by the public NLM endpoint
+METAMAPLITE_RATE_LIMIT: float = 5
+METAMAPLITE_BURST: int = 5
+
+
+class MetaMapLiteError(IOError):
+    pass
+
+
+class TokenBucket:
+    """Allow on average `rate` acquisitions per second, with bursts of up
+    to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[int] = None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class MetaMapLiteClient:
+    """Pooled, rate-limited MetaMapLite client.
+
+    ```
+    async with MetaMapLiteClient(rate=10) as client:
+        annotations = await client.annotate_batch(texts)
+    ```
+    """
+
+    def __init__(
+        self,
+        url: str = METAMAPLITE_URL,
+        rate: float = METAMAPLITE_RATE_LIMIT,
+        burst: int = METAMAPLITE_BURST,
+        max_connections: int = 10,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        timeout: float = 30,
+    ):
+        self.url = url
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate=rate, capacity=burst)
+        self.n_requests = 0
+        self.n_retries = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def open(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections, keepalive_timeout=60
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"Accept": "text/plain"},
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return self.backoff * 2**attempt + random.uniform(0, self.backoff)
+
+    async def annotate(self, text: str) -> list:
+        payload = {
+            "inputtext": str(text),
+            "docformat": "freetext",
+            "resultformat": "json",
+        }
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            self.n_requests += 1
+            try:
+                async with self._session.post(self.url, data=payload) as response:
+                    if response.status == 429 or response.status >= 500:
+                        error = f"HTTP {response.status}"
+                        delay = self._retry_delay(
+                            attempt, response.headers.get("Retry-After")
+                        )
+                    else:
+                        response.raise_for_status()
+                        return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = repr(e)
+                delay = self._retry_delay(attempt)
+            if attempt == self.max_retries:
+                break
+            logging.debug(
+                f"MetaMapLite request failed ({error}), retry in {delay:.2f}s"
+            )
+            self.n_retries += 1
+            await asyncio.sleep(delay)
+        raise MetaMapLiteError(
+            f"MetaMapLite request failed after {self.max_retries} retries: {error}"
+        )
+
+    async def annotate_batch(
+        self, texts: List[str], concurrency: Optional[int] = None
+    ) -> list:
+        """Annotate all texts, returning results in input order. Failed
+        requests are returned as their exception."""
+        results = sliding_window(
+            self.annotate, texts, concurrency=concurrency or self.max_connections
+        )
+        scheduled = [result async for result in results]
+        return [result.result for result in restore_order(scheduled)]
@@ -0,0 +1,237 @@
+"""Prebuilt NLP pipeline for triple extraction.
+
+Assembling the pipeline means loading the spaCy model, adding `claucy`,
+`InformationExtractor` and the scispaCy linker, which builds the UMLS
+knowledge base from JSON and re-adds every alias vector to the ANN index.
+`save_pipeline` does all of that once and writes the result to disk:
+
+    <path>/nlp/              spaCy pipeline without the linker
+    <path>/linker/kb/        memory-mapped knowledge base, see `compact_kb`
+    <path>/linker/tfidf.pkl  pickled TF-IDF vectorizer
+    <path>/linker/ann.bin    nmslib index, saved together with its data
+    <path>/meta.json         model name, linker config and build date
+
+`load_pipeline` restores it and records how long each part took to load.
+
+Build with
+```
+python -m stages.spacy_pipeline.artifact --model en_core_sci_scibert --output <path>
+```
+"""
+
+import gc
+import json
+import time
+import pickle
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Dict, Optional, Union
+
+import spacy
+import nmslib
+from scispacy.candidate_generation import CandidateGenerator
+
+from . import claucy, information_extractor  # noqa
+from .compact_kb import CompactKnowledgeBase
+from .linker import BatchEntityLinker
+
+ALLOWED_MODELS = [
+    "en_core_sci_sm",
+    "en_core_sci_md",
+    "en_core_sci_lg",
+    "en_core_sci_scibert",
+]
+LINKER_CONFIG = {
+    "resolve_abbreviations": False,
+    "linker_name": "umls",
+    "max_entities_per_mention": 1,
+}
+ANN_EF_SEARCH = 200
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], name: str):
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+
+
+def _load_pickle(path: Path):
+    # Skipping the cyclic GC while millions of objects are created makes
+    # unpickling large objects such as the vectorizer several times faster.
+    gc.disable()
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    finally:
+        gc.enable()
+
+
+def build_pipeline(
+    spacy_model: str = "en_core_sci_scibert", linker: bool = True
+) -> spacy.Language:
+    if spacy_model not in ALLOWED_MODELS:
+        raise ValueError(
+            f"Model '{spacy_model}' is not applicable for this task."
+            + f"Allowed models are: '{', '.join(ALLOWED_MODELS)}'."
+        )
+    nlp = spacy.load(spacy_model)
+    nlp.add_pipe("claucy")
+    nlp.add_pipe("InformationExtractor", after="claucy")
+    if linker:
+        nlp.add_pipe("scispacy_linker", config=LINKER_CONFIG)
+    return nlp
+
+
+def save_pipeline(nlp: spacy.Language, path: Union[str, Path], spacy_model: str):
+    path = Path(path)
+    linker_dir = path / "linker"
+    linker_dir.mkdir(parents=True, exist_ok=True)
+    linker = nlp.get_pipe("scispacy_linker")
+    candidate_generator = linker.candidate_generator
+
+    CompactKnowledgeBase.build(
+        linker.kb,
+        linker_dir / "kb",
+        ann_aliases=candidate_generator.ann_concept_aliases_list,
+    )
+    with open(linker_dir / "tfidf.pkl", "wb") as f:
+        pickle.dump(candidate_generator.vectorizer, f, protocol=pickle.HIGHEST_PROTOCOL)
+    candidate_generator.ann_index.saveIndex(str(linker_dir / "ann.bin"), save_data=True)
+
+    # The linker has no weights of its own, it is excluded again on load
+    nlp.to_disk(path / "nlp")
+    meta = {
+        "spacy_model": spacy_model,
+        "pipe_names": nlp.pipe_names,
+        "linker_config": LINKER_CONFIG,
+        "date_built": datetime.now().isoformat(),
+    }
+    with open(path / "meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+    logging.info(f"Saved NLP pipeline for '{spacy_model}' to '{path}'.")
+
+
+def load_candidate_generator(
+    path: Union[str, Path], timings: Dict[str, float]
+) -> CandidateGenerator:
+    path = Path(path)
+    with _timed(timings, "linker.kb"):
+        kb = CompactKnowledgeBase(path / "kb")
+    with _timed(timings, "linker.tfidf"):
+        vectorizer = _load_pickle(path / "tfidf.pkl")
+    with _timed(timings, "linker.ann_index"):
+        ann_index = nmslib.init(
+            method="hnsw",
+            space="cosinesimil_sparse",
+            data_type=nmslib.DataType.SPARSE_VECTOR,
+        )
+        ann_index.loadIndex(str(path / "ann.bin"), load_data=True)
+        ann_index.setQueryTimeParams({"efSearch": ANN_EF_SEARCH})
+    return CandidateGenerator(
+        ann_index=ann_index,
+        tfidf_vectorizer=vectorizer,
+        ann_concept_aliases_list=kb.ann_aliases,
+        kb=kb,
+    )
+
+
+@spacy.Language.factory(
+    "cached_scispacy_linker",
+    default_config={
+        "path": "",
+        "resolve_abbreviations": False,
+        "linker_name": "umls",
+        "max_entities_per_mention": 1,
+        "exact_match": True,
+        "cache_path": "",
+        "cache_namespace": "",
+    },
+)
+def create_cached_linker(
+    nlp,
+    name,
+    path,
+    resolve_abbreviations,
+    linker_name,
+    max_entities_per_mention,
+    exact_match,
+    cache_path,
+    cache_namespace,
+):
+    """scispaCy linker restored from a pipeline saved with `save_pipeline`,
+    see `BatchEntityLinker` for `exact_match` and `cache_path`."""
+    timings = {}
+    linker = BatchEntityLinker(
+        nlp=nlp,
+        name=name,
+        candidate_generator=load_candidate_generator(path, timings),
+        resolve_abbreviations=resolve_abbreviations,
+        max_entities_per_mention=max_entities_per_mention,
+        exact_match=exact_match,
+        cache_path=cache_path or None,
+        cache_namespace=cache_namespace,
+    )
+    linker.load_timings = timings
+    return linker
+
+
+def _load_nlp(path: Path, timings: Dict[str, float]) -> spacy.Language:
+    # Same steps as `spacy.load`, split up to time every component.
+    with _timed(timings, "config"):
+        config = spacy.util.load_config(path / "config.cfg")
+        nlp = spacy.util.load_model_from_config(
+            config,
+            meta=spacy.util.get_model_meta(path),
+            exclude=["scispacy_linker"],
+        )
+    parts = ["vocab", "tokenizer"] + [
+        name for name, proc in nlp.pipeline if hasattr(proc, "from_disk")
+    ]
+    for part in parts:
+        with _timed(timings, part):
+            nlp.from_disk(path, exclude=[other for other in parts if other != part])
+    return nlp
+
+
+def load_pipeline(
+    path: Union[str, Path], link_cache_path: Optional[str] = None
+) -> spacy.Language:
+    """Restore a pipeline saved with `save_pipeline`. Mention links are
+    cached across runs in `link_cache_path`, if given."""
+    path = Path(path)
+    with open(path / "meta.json", "r") as f:
+        meta = json.load(f)
+    timings = {}
+    nlp = _load_nlp(path / "nlp", timings)
+    with _timed(timings, "scispacy_linker"):
+        linker = nlp.add_pipe(
+            "cached_scispacy_linker",
+            name="scispacy_linker",
+            config={
+                "path": str(path / "linker"),
+                "cache_path": link_cache_path or "",
+                "cache_namespace": meta["date_built"],
+                **meta["linker_config"],
+            },
+        )
+    timings.update(linker.load_timings)
+    nlp.meta["load_timings"] = timings
+    breakdown = ", ".join(f"{name}: {secs:.2f}s" for name, secs in timings.items())
+    logging.info(f"Loaded NLP pipeline '{meta['spacy_model']}' ({breakdown}).")
+    return nlp
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the triple extraction NLP pipeline."
+    )
+    parser.add_argument(
+        "--model", default="en_core_sci_scibert", choices=ALLOWED_MODELS
+    )
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    save_pipeline(build_pipeline(args.model), args.output, spacy_model=args.model)
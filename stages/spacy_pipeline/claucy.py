@@ -88,6 +88,10 @@ scarcely
 seldom
 rarely""".split(),
 }
+# Only used for membership tests
+dictionary = {key: frozenset(words) for key, words in dictionary.items()}
+
+_VERB_MATCHERS = {}
 
 
 # @spacy.Language.component('claucy')
@@ -285,7 +289,7 @@ class Clause:
 
             for verb in verbs:
                 prop = [subj, verb]
-                if self.type in ["SV", "SVA"]:
+                if self.type in {"SV", "SVA"}:
                     if self.adverbials:
                         for a in self.adverbials:
                             propositions.append(tuple(prop + [a]))
@@ -381,11 +385,12 @@ def _convert_clauses_to_text(propositions, inflect, capitalize):
     return proposition_texts
 
 
-def _get_verb_matches(span):
-    # 1. Find verb phrases in the span
-    # (see mdmjsh answer here: https://stackoverflow.com/questions/47856247/extract-verb-phrases-using-spacy)
-
-    verb_matcher = Matcher(span.vocab)
+def _get_verb_matcher(vocab):
+    # One matcher per vocab, building it is far more expensive than matching.
+    cached = _VERB_MATCHERS.get(id(vocab))
+    if cached is not None and cached[0] is vocab:
+        return cached[1]
+    verb_matcher = Matcher(vocab)
     verb_matcher.add(
         "Auxiliary verb phrase aux-verb",
         [
@@ -397,8 +402,14 @@ def _get_verb_matches(span):
         "Verb phrase",
         [[{"POS": "VERB"}]],
     )
+    _VERB_MATCHERS[id(vocab)] = (vocab, verb_matcher)
+    return verb_matcher
+
 
-    return verb_matcher(span)
+def _get_verb_matches(span):
+    # 1. Find verb phrases in the span
+    # (see mdmjsh answer here: https://stackoverflow.com/questions/47856247/extract-verb-phrases-using-spacy)
+    return _get_verb_matcher(span.vocab)(span)
 
 
 def _get_verb_chunks(span):
@@ -406,26 +417,28 @@ def _get_verb_chunks(span):
 
     # Filter matches (e.g. do not have both "has won" and "won" in verbs)
     verb_chunks = []
+    roots = set()
     for match in [span[start:end] for _, start, end in matches]:
-        if match.root not in [vp.root for vp in verb_chunks]:
+        if match.root.i not in roots:
+            roots.add(match.root.i)
             verb_chunks.append(match)
     return verb_chunks
 
 
 def _get_subject(verb):
     for c in verb.root.children:
-        if c.dep_ in ["nsubj", "nsubjpass"]:
+        if c.dep_ in {"nsubj", "nsubjpass"}:
             subject = extract_span_from_entity(c)
             return subject
 
     root = verb.root
-    while root.dep_ in ["conj", "cc", "advcl", "acl", "ccomp", "ROOT"]:
+    while root.dep_ in {"conj", "cc", "advcl", "acl", "ccomp", "ROOT"}:
         for c in root.children:
-            if c.dep_ in ["nsubj", "nsubjpass"]:
+            if c.dep_ in {"nsubj", "nsubjpass"}:
                 subject = extract_span_from_entity(c)
                 return subject
 
-            if c.dep_ in ["acl", "advcl"]:
+            if c.dep_ in {"acl", "advcl"}:
                 subject = find_verb_subject(c)
                 return extract_span_from_entity(subject) if subject else None
 
@@ -436,7 +449,7 @@ def _get_subject(verb):
             root = verb.root.head
 
     for c in root.children:
-        if c.dep_ in ["nsubj", "nsubj:pass", "nsubjpass"]:
+        if c.dep_ in {"nsubj", "nsubj:pass", "nsubjpass"}:
             subject = extract_span_from_entity(c)
             return subject
     return None
@@ -465,10 +478,10 @@ def extract_clauses(span):
                 clause = Clause(subject=subject, complement=complement)
                 yield clause
 
-        indirect_object = _find_matching_child(verb.root, ["dative"])
-        direct_object = _find_matching_child(verb.root, ["dobj"])
+        indirect_object = _find_matching_child(verb.root, {"dative"})
+        direct_object = _find_matching_child(verb.root, {"dobj"})
         complement = _find_matching_child(
-            verb.root, ["ccomp", "acomp", "xcomp", "attr"]
+            verb.root, {"ccomp", "acomp", "xcomp", "attr"}
         )
         adverbials = [
             extract_span_from_entity(c)
@@ -489,6 +502,8 @@ def extract_clauses(span):
 
 @spacy.Language.component("claucy")
 def extract_clauses_doc(doc):
+    # The extension default is a shared list, give every doc its own.
+    doc._.clauses = []
     for sent in doc.sents:
         clauses = list(extract_clauses(sent))
         sent._.clauses = clauses
@@ -501,22 +516,21 @@ def add_to_pipe(nlp):
 
 
 def extract_span_from_entity(token):
-    ent_subtree = sorted([c for c in token.subtree], key=lambda x: x.i)
-    return Span(token.doc, start=ent_subtree[0].i, end=ent_subtree[-1].i + 1)
+    # The edges are the first and last token of the subtree
+    return Span(token.doc, start=token.left_edge.i, end=token.right_edge.i + 1)
 
 
 def extract_span_from_entity_no_cc(token):
-    ent_subtree = sorted(
-        [token] + [c for c in token.children if c.dep_ not in ["cc", "conj", "prep"]],
-        key=lambda x: x.i,
-    )
-    return Span(token.doc, start=ent_subtree[0].i, end=ent_subtree[-1].i + 1)
+    ent_subtree = [token.i] + [
+        c.i for c in token.children if c.dep_ not in {"cc", "conj", "prep"}
+    ]
+    return Span(token.doc, start=min(ent_subtree), end=max(ent_subtree) + 1)
 
 
 def extract_ccs_from_entity(token):
     entities = [extract_span_from_entity_no_cc(token)]
     for c in token.children:
-        if c.dep_ in ["conj", "cc"]:
+        if c.dep_ in {"conj", "cc"}:
             entities += extract_ccs_from_entity(c)
     return entities
 
@@ -529,17 +543,13 @@ def extract_ccs_from_token_at_root(span):
 
 
 def extract_ccs_from_token(token):
-    if token.pos_ in ["NOUN", "PROPN", "ADJ"]:
-        children = sorted(
-            [token]
-            + [
-                c
-                for c in token.children
-                if c.dep_ in ["advmod", "amod", "det", "poss", "compound"]
-            ],
-            key=lambda x: x.i,
-        )
-        entities = [Span(token.doc, start=children[0].i, end=children[-1].i + 1)]
+    if token.pos_ in {"NOUN", "PROPN", "ADJ"}:
+        children = [token.i] + [
+            c.i
+            for c in token.children
+            if c.dep_ in {"advmod", "amod", "det", "poss", "compound"}
+        ]
+        entities = [Span(token.doc, start=min(children), end=max(children) + 1)]
     else:
         entities = [Span(token.doc, start=token.i, end=token.i + 1)]
     for c in token.children:
@@ -553,16 +563,16 @@ def find_verb_subject(v):
     Returns the nsubj, nsubjpass of the verb. If it does not exist and the root is a head,
     find the subject of that verb instead.
     """
-    if v.dep_ in ["nsubj", "nsubjpass", "nsubj:pass"]:
+    if v.dep_ in {"nsubj", "nsubjpass", "nsubj:pass"}:
         return v
     # guard against infinite recursion on root token
-    elif v.dep_ in ["advcl", "acl"] and v.head.dep_ != "ROOT":
+    elif v.dep_ in {"advcl", "acl"} and v.head.dep_ != "ROOT":
         return find_verb_subject(v.head)
 
     for c in v.children:
-        if c.dep_ in ["nsubj", "nsubjpass", "nsubj:pass"]:
+        if c.dep_ in {"nsubj", "nsubjpass", "nsubj:pass"}:
             return c
-        elif c.dep_ in ["advcl", "acl"] and v.head.dep_ != "ROOT":
+        elif c.dep_ in {"advcl", "acl"} and v.head.dep_ != "ROOT":
             return find_verb_subject(v.head)
 
 
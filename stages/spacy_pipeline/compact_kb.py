@@ -0,0 +1,340 @@
+"""Compact, memory-mapped UMLS knowledge base.
+
+scispaCy keeps the whole knowledge base as Python dicts of `Entity`
+tuples and alias sets, which takes several GB in every process that runs
+the linker. `CompactKnowledgeBase` stores the same data as one UTF-8
+string blob plus flat offset arrays:
+
+    <path>/strings.bin                all strings, back to back
+    <path>/concepts.npy               (start, end) of every concept id, sorted
+    <path>/canonical_names.npy        (start, end) of every canonical name
+    <path>/definitions.npy            (start, end) of every definition, -1 if none
+    <path>/aliases.npy                (start, end) of every alias, sorted
+    <path>/types.npy                  (start, end) of every semantic type
+    <path>/<name>.offsets.npy         row offsets into <name>.values.npy for
+    <path>/<name>.values.npy          alias_cuis, concept_aliases, concept_types
+    <path>/ann_aliases.npy            alias of every row in the ANN index
+    <path>/normalized.npy             (start, end) of every case-folded alias
+    <path>/normalized.slots.npy       open-addressing hash table over normalized
+
+All files are memory-mapped read-only, so worker processes share the pages
+through the OS page cache instead of each holding a copy. Lookups use a
+binary search over the sorted tables and only decode the strings they
+return, or a single hash probe for `exact_match`.
+
+`cui_to_entity` and `alias_to_cuis` are read-only mappings with the same
+interface as scispaCy's `KnowledgeBase`, so the instance can be passed to
+`CandidateGenerator` and `EntityLinker` directly.
+"""
+
+import mmap
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scispacy.linking_utils import Entity
+
+_LISTS = ["alias_cuis", "concept_aliases", "concept_types", "normalized_cuis"]
+
+
+def normalize_alias(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+class _StringTable(Sequence):
+    """Strings stored as (start, end) byte spans into a shared blob."""
+
+    def __init__(self, blob: mmap.mmap, spans: np.ndarray):
+        self._blob = blob
+        self._spans = spans
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        start, end = self._spans[i]
+        if start < 0:
+            return None
+        return self._blob[start:end].decode("utf-8")
+
+    def _bytes(self, i: int) -> bytes:
+        start, end = self._spans[i]
+        return self._blob[start:end]
+
+    def find(self, key: str) -> int:
+        """Index of `key` in a table sorted by UTF-8 bytes, or -1."""
+        key = key.encode("utf-8")
+        low, high = 0, len(self._spans)
+        while low < high:
+            mid = (low + high) // 2
+            if self._bytes(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self._spans) and self._bytes(low) == key:
+            return low
+        return -1
+
+
+class _Lists:
+    """Variable-length integer lists in CSR layout."""
+
+    def __init__(self, offsets: np.ndarray, values: np.ndarray):
+        self._offsets = offsets
+        self._values = values
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self._values[self._offsets[i] : self._offsets[i + 1]]
+
+
+class _HashIndex:
+    """Hash table from string to row of a `_StringTable`, with linear
+    probing. crc32 is used because `hash` differs between processes."""
+
+    def __init__(self, strings: _StringTable, slots: np.ndarray):
+        self._strings = strings
+        self._slots = slots
+        self._mask = len(slots) - 1
+
+    @staticmethod
+    def build(keys: Sequence[bytes]) -> np.ndarray:
+        # At least twice as many slots as keys keeps probe sequences short
+        slots = np.full(1 << (2 * len(keys)).bit_length(), -1, dtype=np.int32)
+        mask = len(slots) - 1
+        for i, key in enumerate(keys):
+            slot = zlib.crc32(key) & mask
+            while slots[slot] >= 0:
+                slot = (slot + 1) & mask
+            slots[slot] = i
+        return slots
+
+    def find(self, key: str) -> int:
+        key = _utf8(key)
+        slot = zlib.crc32(key) & self._mask
+        while True:
+            i = int(self._slots[slot])
+            if i < 0 or self._strings._bytes(i) == key:
+                return i
+            slot = (slot + 1) & self._mask
+
+
+class _AnnAliases(Sequence):
+    """ANN index row -> alias, in the shape of `ann_concept_aliases_list`."""
+
+    def __init__(self, aliases: _StringTable, ids: np.ndarray):
+        self._aliases = aliases
+        self._ids = ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, i: int) -> str:
+        return self._aliases[self._ids[i]]
+
+
+class _EntityView(Mapping):
+    def __init__(self, kb: "CompactKnowledgeBase"):
+        self._kb = kb
+
+    def __len__(self) -> int:
+        return len(self._kb.concepts)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._kb.concepts)
+
+    def __contains__(self, cui) -> bool:
+        return isinstance(cui, str) and self._kb.concepts.find(cui) >= 0
+
+    def __getitem__(self, cui: str) -> Entity:
+        i = self._kb.concepts.find(cui)
+        if i < 0:
+            raise KeyError(cui)
+        return self._kb.entity(i)
+
+
+class _AliasView(Mapping):
+    def __init__(self, kb: "CompactKnowledgeBase"):
+        self._kb = kb
+
+    def __len__(self) -> int:
+        return len(self._kb.aliases)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._kb.aliases)
+
+    def __contains__(self, alias) -> bool:
+        return isinstance(alias, str) and self._kb.aliases.find(alias) >= 0
+
+    def __getitem__(self, alias: str) -> set:
+        i = self._kb.aliases.find(alias)
+        if i < 0:
+            raise KeyError(alias)
+        return {self._kb.concepts[j] for j in self._kb.alias_cuis[i]}
+
+
+class CompactKnowledgeBase:
+    """Read-only knowledge base loaded from a directory written by
+    `CompactKnowledgeBase.build`.
+
+    ```
+    kb = CompactKnowledgeBase("umls_kb")
+    entity = kb.cui_to_entity["C0004057"]
+    entity.canonical_name, entity.definition, entity.aliases
+    ```
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / "strings.bin", "rb") as f:
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.concepts = _StringTable(self._blob, self._load("concepts"))
+        self.canonical_names = _StringTable(self._blob, self._load("canonical_names"))
+        self.definitions = _StringTable(self._blob, self._load("definitions"))
+        self.aliases = _StringTable(self._blob, self._load("aliases"))
+        self.types = _StringTable(self._blob, self._load("types"))
+        for name in _LISTS:
+            lists = _Lists(self._load(f"{name}.offsets"), self._load(f"{name}.values"))
+            setattr(self, name, lists)
+        self.ann_aliases = _AnnAliases(self.aliases, self._load("ann_aliases"))
+        self.normalized = _StringTable(self._blob, self._load("normalized"))
+        self._normalized_index = _HashIndex(
+            self.normalized, self._load("normalized.slots")
+        )
+        self.cui_to_entity = _EntityView(self)
+        self.alias_to_cuis = _AliasView(self)
+
+    def __repr__(self):
+        return (
+            f"CompactKnowledgeBase(path='{self.path}', concepts={len(self.concepts)})"
+        )
+
+    def __getstate__(self):
+        # Worker processes re-map the files instead of copying the data
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(self.path / f"{name}.npy", mmap_mode="r")
+
+    def entity(self, i: int) -> Entity:
+        return Entity(
+            concept_id=self.concepts[i],
+            canonical_name=self.canonical_names[i],
+            aliases=[self.aliases[j] for j in self.concept_aliases[i]],
+            types=[self.types[j] for j in self.concept_types[i]],
+            definition=self.definitions[i],
+        )
+
+    def exact_match(self, text: str) -> List[str]:
+        """Sorted CUIs with an alias equal to `text` after case folding and
+        whitespace normalization. The order says nothing about how well an
+        ambiguous alias fits each concept."""
+        i = self._normalized_index.find(normalize_alias(text))
+        if i < 0:
+            return []
+        return [self.concepts[j] for j in self.normalized_cuis[i]]
+
+    @classmethod
+    def build(
+        cls,
+        kb,
+        path: Union[str, Path],
+        ann_aliases: Optional[Iterable[str]] = None,
+    ) -> "CompactKnowledgeBase":
+        """Write a scispaCy `KnowledgeBase` to `path` and load it.
+
+        `ann_aliases` is the alias list of the linker's ANN index, in index
+        order, so that the candidate generator can share the alias table."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        writer = _StringWriter()
+
+        concept_ids = sorted(kb.cui_to_entity, key=_utf8)
+        alias_ids = sorted(
+            set(kb.alias_to_cuis).union(
+                *(entity.aliases for entity in kb.cui_to_entity.values())
+            ),
+            key=_utf8,
+        )
+        type_ids = sorted(
+            set().union(*(entity.types for entity in kb.cui_to_entity.values())),
+            key=_utf8,
+        )
+        concept_index = {cui: i for i, cui in enumerate(concept_ids)}
+        alias_index = {alias: i for i, alias in enumerate(alias_ids)}
+        type_index = {tui: i for i, tui in enumerate(type_ids)}
+
+        normalized = {}
+        for alias, cuis in kb.alias_to_cuis.items():
+            normalized.setdefault(normalize_alias(alias), set()).update(
+                concept_index[cui] for cui in cuis
+            )
+
+        entities = [kb.cui_to_entity[cui] for cui in concept_ids]
+        arrays = {
+            "concepts": writer.spans(concept_ids),
+            "canonical_names": writer.spans(e.canonical_name for e in entities),
+            "definitions": writer.spans(e.definition for e in entities),
+            "aliases": writer.spans(alias_ids),
+            "types": writer.spans(type_ids),
+            "normalized": writer.spans(normalized),
+            "normalized.slots": _HashIndex.build([_utf8(key) for key in normalized]),
+        }
+        lists = {
+            "alias_cuis": (
+                sorted(concept_index[cui] for cui in kb.alias_to_cuis.get(alias, ()))
+                for alias in alias_ids
+            ),
+            "concept_aliases": (
+                [alias_index[alias] for alias in e.aliases] for e in entities
+            ),
+            "concept_types": ([type_index[tui] for tui in e.types] for e in entities),
+            "normalized_cuis": (sorted(cuis) for cuis in normalized.values()),
+        }
+        for name, rows in lists.items():
+            arrays[f"{name}.offsets"], arrays[f"{name}.values"] = _to_csr(rows)
+        arrays["ann_aliases"] = np.array(
+            [alias_index[alias] for alias in ann_aliases or ()], dtype=np.int32
+        )
+
+        with open(path / "strings.bin", "wb") as f:
+            f.write(writer.getvalue())
+        for name, array in arrays.items():
+            np.save(path / f"{name}.npy", array)
+        return cls(path)
+
+
+class _StringWriter:
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._size = 0
+
+    def spans(self, strings: Iterable[Optional[str]]) -> np.ndarray:
+        spans = []
+        for string in strings:
+            if string is None:
+                spans.append((-1, -1))
+                continue
+            encoded = _utf8(string)
+            spans.append((self._size, self._size + len(encoded)))
+            self._chunks.append(encoded)
+            self._size += len(encoded)
+        return np.array(spans, dtype=np.int64).reshape(-1, 2)
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._chunks)
+
+
+def _utf8(string: str) -> bytes:
+    return string.encode("utf-8")
+
+
+def _to_csr(rows: Iterable[Sequence[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets, values = [0], []
+    for row in rows:
+        values.extend(row)
+        offsets.append(len(values))
+    return np.array(offsets, dtype=np.int64), np.array(values, dtype=np.int32)
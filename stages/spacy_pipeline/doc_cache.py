@@ -0,0 +1,57 @@
+"""Persistent cache of parsed documents.
+
+Tokens, tags, dependencies and entities of every parsed text are stored
+as a one-document `DocBin`, keyed by the text and the model name and
+version. Changes to the rule-based components that run after the model
+(`claucy`, `InformationExtractor`, the linker) can then be re-run on the
+cached docs without parsing again.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, Union
+
+import spacy
+from spacy.tokens import Doc, DocBin
+
+from ..cache import PersistentCache, cache_key
+
+
+def model_version(nlp: spacy.Language) -> str:
+    meta = nlp.meta
+    return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}"
+
+
+def _to_bytes(doc: Doc) -> bytes:
+    return DocBin(docs=[doc], store_user_data=False).to_bytes()
+
+
+class ParsedDocCache:
+    def __init__(self, path: Union[str, Path], max_entries: int = 1_000_000):
+        self.cache = PersistentCache(
+            path, max_entries=max_entries, dumps=_to_bytes, loads=bytes
+        )
+
+    def __repr__(self):
+        return f"ParsedDocCache(path='{self.cache.path}')"
+
+    @property
+    def stats(self):
+        return self.cache.stats
+
+    def get_many(self, nlp: spacy.Language, texts: Iterable[str]) -> Dict[str, Doc]:
+        version = model_version(nlp)
+        keys = {text: cache_key(version, text) for text in texts}
+        found = self.cache.get_many(keys.values())
+        docs = {}
+        for text, key in keys.items():
+            if key in found:
+                doc_bin = DocBin().from_bytes(found[key])
+                docs[text] = next(doc_bin.get_docs(nlp.vocab))
+        return docs
+
+    def put_many(self, nlp: spacy.Language, docs: Iterable[Doc]):
+        version = model_version(nlp)
+        self.cache.put_many({cache_key(version, doc.text): doc for doc in docs})
+
+    def close(self):
+        self.cache.close()
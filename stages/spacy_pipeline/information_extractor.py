@@ -1,9 +1,97 @@
+import weakref
 import warnings
 import logging
 import itertools
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque
 
+import numpy as np
 import spacy
-from spacy.tokens import Doc
+from spacy.tokens import Doc, Span
+
+
+class _TermAutomaton:
+    """Aho-Corasick automaton that finds the first occurrence of every term
+    in a single pass over the text."""
+
+    def __init__(self, terms):
+        self.terms = [term for term in dict.fromkeys(terms) if term]
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for term in self.terms:
+            node = 0
+            for char in term:
+                child = self._goto[node].get(char)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][char] = child
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = child
+            self._out[node].append(term)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail if fail != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def first_occurrences(self, text):
+        found = {}
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for term in self._out[node]:
+                if term not in found:
+                    found[term] = i - len(term) + 1
+            if len(found) == len(self.terms):
+                break
+        return found
+
+
+class _MatchIndex:
+    """Casefolded text, token offsets and named entity positions of a doc,
+    shared by all triples of that doc."""
+
+    def __init__(self, doc, terms):
+        self.terms = terms
+        self.starts = [tok.idx for tok in doc]
+        self.ends = [tok.idx + len(tok) for tok in doc]
+        self.occurrences = _TermAutomaton(terms).first_occurrences(doc.text.casefold())
+        if "" in terms:
+            self.occurrences[""] = 0
+
+    def count_tokens(self, span, start, stop):
+        """Number of tokens of `span` that lie within [start, stop]."""
+        lo = bisect_left(self.starts, start, span.start, span.end)
+        hi = bisect_right(self.starts, stop, lo, span.end)
+        return bisect_right(self.ends, stop, lo, hi) - lo
+
+
+# Triples of the same doc are matched one after the other. The index
+# holds no reference to its doc, so entries go away with their docs.
+_match_indexes = weakref.WeakKeyDictionary()
+_match_indexes_lock = threading.Lock()
+
+
+def _match_index(doc, terms):
+    with _match_indexes_lock:
+        index = _match_indexes.get(doc)
+    if index is None or index.terms != terms:
+        index = _MatchIndex(doc, terms)
+        with _match_indexes_lock:
+            _match_indexes[doc] = index
+    return index
 
 
 class Triple:
@@ -52,31 +140,35 @@ class Triple:
                 break
             yield tok.orth_
 
-    def _find_ne(self, span, ne):
+    def _find_ne(self, span, ne, index=None):
         matched = ne.matched_term
-        try:
-            start = span.doc.text.casefold().index(matched.casefold())
-        except ValueError:
-            return False
-        stop = start + len(matched)
-        for tok in span:
-            tok_idx = tok.idx
-            if tok_idx > stop:
-                break
-            if start <= tok.idx and tok.idx + len(tok) <= stop:
-                ne.idx = start
-                yield ne
+        if index is None:
+            index = _match_index(span.doc, (matched.casefold(),))
+        start = index.occurrences.get(matched.casefold())
+        if start is None:
+            return
+        n_tokens = index.count_tokens(span, start, start + len(matched))
+        if n_tokens:
+            ne.idx = start
+        # One entry per token covered by the named entity
+        yield from itertools.repeat(ne, n_tokens)
 
     def match(self, nes):
         self._is_matched = True
+        terms = tuple(ne.matched_term.casefold() for ne in nes)
+        index = _match_index(self.subject.doc, terms)
         self.subject_nes = list(
             itertools.chain(
-                *filter(None, [list(self._find_ne(self.subject, ne)) for ne in nes])
+                *filter(
+                    None, [list(self._find_ne(self.subject, ne, index)) for ne in nes]
+                )
             )
         )
         self.object_nes = list(
             itertools.chain(
-                *filter(None, [list(self._find_ne(self.object_, ne)) for ne in nes])
+                *filter(
+                    None, [list(self._find_ne(self.object_, ne, index)) for ne in nes]
+                )
             )
         )
         if not self.object_nes:
@@ -91,6 +183,26 @@ class Triple:
     def edges(self):
         pass
 
+    def pack(self):
+        """Token offsets of subject, verb and object as plain integers."""
+        return [
+            self.subject.start,
+            self.subject.end,
+            self.verb.start,
+            self.verb.end,
+            self.object_.start,
+            self.object_.end,
+        ]
+
+    @classmethod
+    def unpack(cls, doc, packed):
+        subj_start, subj_end, verb_start, verb_end, obj_start, obj_end = packed
+        return cls(
+            subject=doc[subj_start:subj_end],
+            verb=doc[verb_start:verb_end],
+            object_=doc[obj_start:obj_end],
+        )
+
     @classmethod
     def from_svo(cls, clause):
         obj = clause.direct_object or clause.indirect_object
@@ -106,10 +218,118 @@ class Triple:
         return cls(subject=subj, verb=verb, object_=obj)
 
 
-@spacy.Language.factory("InformationExtractor")
+class CompactSpan:
+    """Token and character offsets, text, entities and linked CUIs of a
+    span, without a reference to its `Doc`."""
+
+    __slots__ = ("start", "end", "start_char", "end_char", "text", "ents", "kb_ents")
+
+    def __init__(self, start, end, start_char, end_char, text, ents=(), kb_ents=()):
+        self.start = start
+        self.end = end
+        self.start_char = start_char
+        self.end_char = end_char
+        self.text = text
+        self.ents = ents
+        self.kb_ents = kb_ents
+
+    def __repr__(self):
+        return self.text
+
+    @classmethod
+    def from_span(cls, span, with_ents=True):
+        ents = ()
+        if with_ents:
+            ents = [cls.from_span(ent, with_ents=False) for ent in span.ents]
+        return cls(
+            span.start, span.end, span.start_char, span.end_char, span.text, ents
+        )
+
+
+class CompactTriple:
+    """`Triple` reduced to `CompactSpan`s, so that the doc, its transformer
+    output and its clauses can be freed as soon as the triples exist."""
+
+    __slots__ = ("subject", "verb", "object_")
+
+    def __init__(self, subject, verb, object_):
+        self.subject = subject
+        self.verb = verb
+        self.object_ = object_
+
+    def __repr__(self):
+        return f"{self.subject}\n  -> {self.verb}\n     -> {self.object_}"
+
+    def pack(self):
+        return [
+            self.subject.start,
+            self.subject.end,
+            self.verb.start,
+            self.verb.end,
+            self.object_.start,
+            self.object_.end,
+        ]
+
+    @classmethod
+    def from_triple(cls, triple):
+        return cls(
+            subject=CompactSpan.from_span(triple.subject),
+            verb=CompactSpan.from_span(triple.verb, with_ents=False),
+            object_=CompactSpan.from_span(triple.object_),
+        )
+
+    @classmethod
+    def unpack(cls, doc, packed):
+        return cls.from_triple(Triple.unpack(doc, packed))
+
+
+def _is_complete(triple):
+    return triple is not None and triple.object_ is not None
+
+
+def _drop_clauses(doc):
+    doc._.clauses = []
+    for key in list(doc.user_data):
+        if isinstance(key, tuple) and len(key) == 4 and key[1] == "clauses":
+            del doc.user_data[key]
+
+
+def _release(doc):
+    """Drop what is no longer needed once the triples are extracted: the
+    clauses and the transformer and token vector output."""
+    _drop_clauses(doc)
+    if Doc.has_extension("trf_data"):
+        doc._.trf_data = None
+    doc.tensor = np.zeros((0,), dtype="float32")
+
+
+def link_triples(doc):
+    """Copy the CUIs the linker assigned to `doc.ents` to the entities of
+    compact triples."""
+    if not Span.has_extension("kb_ents"):
+        return
+    kb_ents = {(ent.start, ent.end): ent._.kb_ents for ent in doc.ents}
+    for triple in doc._.triples:
+        if not isinstance(triple, CompactTriple):
+            continue
+        for ent in itertools.chain(triple.subject.ents, triple.object_.ents):
+            ent.kb_ents = [
+                tuple(link) for link in kb_ents.get((ent.start, ent.end), ())
+            ]
+
+
+@spacy.Language.factory("InformationExtractor", default_config={"compact": False})
 class InformationExtractor:
-    def __init__(self, nlp, name="InformationExtractor"):
+    """Extracts `Triple`s from the clauses found by `claucy`.
+
+    With `compact`, the triples are stored as `CompactTriple`s and the
+    clauses and transformer output of the doc are dropped right away, which
+    keeps memory bounded on large `nlp.pipe` batches. Call `link_triples`
+    after the linker to add the CUIs."""
+
+    def __init__(self, nlp, name="InformationExtractor", compact=False):
         Doc.set_extension("triples", default=[], force=True)
+        self.compact = compact
         # .set_extension("triples")
 
     def extract_triples(self, clauses):
@@ -133,4 +353,41 @@ class InformationExtractor:
             doc._.triples = []
             return doc
         doc._.triples = [triple for triple in self.extract_triples(doc._.clauses)]
+        if self.compact:
+            # Clauses without a complete triple stay as None, so that
+            # consumers such as the cascade's confidence check see them
+            doc._.triples = [
+                CompactTriple.from_triple(triple) if _is_complete(triple) else None
+                for triple in doc._.triples
+            ]
+            doc._.compact_triples = True
+            _release(doc)
         return doc
+
+
+@spacy.Language.component("TripleSerializer")
+def serialize_triples(doc):
+    """Replace triples and clauses with token offsets so that the doc
+    survives `Doc.to_bytes`, e.g. when returned from `nlp.pipe` workers.
+    Use `deserialize_triples` to restore the triples."""
+    doc._.packed_triples = [
+        triple.pack() if _is_complete(triple) else None for triple in doc._.triples
+    ]
+    doc._.triples = []
+    _drop_clauses(doc)
+    return doc
+
+
+def deserialize_triples(doc):
+    if doc._.packed_triples is not None:
+        cls = CompactTriple if doc._.compact_triples else Triple
+        doc._.triples = [
+            cls.unpack(doc, packed) if packed is not None else None
+            for packed in doc._.packed_triples
+        ]
+        doc._.packed_triples = None
+    return doc._.triples
+
+
+Doc.set_extension("packed_triples", default=None, force=True)
+Doc.set_extension("compact_triples", default=False, force=True)
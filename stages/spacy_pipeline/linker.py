@@ -0,0 +1,161 @@
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from spacy.tokens import Doc, Span
+from spacy.util import minibatch
+from scispacy.linking import EntityLinker
+
+from ..cache import PersistentCache, cache_key
+
+Doc.set_extension("link_stats", default=None, force=True)
+
+# Indices into `doc._.link_stats`
+EXACT, CACHED, ANN = range(3)
+
+
+class BatchEntityLinker(EntityLinker):
+    """scispaCy `EntityLinker` that links every distinct mention text of a
+    batch of documents once.
+
+    Mention texts are resolved in three steps:
+    1. with `exact_match`, texts that equal the alias of exactly one concept
+       after case folding get its CUI with a similarity of 1.0, which is
+       what the TF-IDF/ANN search would return for them. Aliases shared by
+       several concepts are left to the search, which ranks them;
+    2. with `cache_path`, texts linked in earlier runs are read from a
+       persistent mention -> CUI cache;
+    3. all remaining texts go through the candidate generator together, as
+       one TF-IDF matrix and one batched sparse nearest-neighbour query.
+    The results are then copied to every mention with that text.
+
+    Exact matching requires a `CompactKnowledgeBase`. The number of mentions
+    linked by each step is stored per document in `doc._.link_stats`.
+    """
+
+    def __init__(
+        self,
+        *args,
+        exact_match: bool = True,
+        cache_path: Optional[str] = None,
+        cache_namespace: str = "",
+        max_cache_entries: int = 1_000_000,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.exact_match = exact_match
+        self.cache_path = cache_path
+        # Cached links are only valid for the same KB and linker settings
+        self.cache_namespace = "|".join(
+            str(part)
+            for part in (
+                cache_namespace,
+                self.k,
+                self.threshold,
+                self.no_definition_threshold,
+                self.filter_for_definitions,
+                self.max_entities_per_mention,
+            )
+        )
+        self.max_cache_entries = max_cache_entries
+        self._cache = None
+        self._cache_pid = None
+
+    @property
+    def cache(self) -> Optional[PersistentCache]:
+        # SQLite connections must not be shared with forked worker processes
+        if self.cache_path and self._cache_pid != os.getpid():
+            self._cache = PersistentCache(
+                self.cache_path, max_entries=self.max_cache_entries
+            )
+            self._cache_pid = os.getpid()
+        return self._cache
+
+    def _mention_text(self, mention: Span) -> str:
+        if self.resolve_abbreviations and Doc.has_extension("abbreviations"):
+            if isinstance(mention._.long_form, Span):
+                return mention._.long_form.text
+            elif isinstance(mention._.long_form, str):
+                return mention._.long_form
+        return mention.text
+
+    def _predict(self, candidates) -> List[tuple]:
+        predicted = []
+        for cand in candidates:
+            score = max(cand.similarities)
+            if (
+                self.filter_for_definitions
+                and self.kb.cui_to_entity[cand.concept_id].definition is None
+                and score < self.no_definition_threshold
+            ):
+                continue
+            if score > self.threshold:
+                predicted.append((cand.concept_id, score))
+        sorted_predicted = sorted(predicted, reverse=True, key=lambda x: x[1])
+        return sorted_predicted[: self.max_entities_per_mention]
+
+    def link(self, texts: Iterable[str]) -> Dict[str, tuple]:
+        """Link distinct mention texts, returning `(source, predicted)` per
+        text, where `source` is one of `EXACT`, `CACHED` or `ANN`."""
+        linked = {}
+        pending = []
+        for text in dict.fromkeys(texts):
+            cuis = self.kb.exact_match(text) if self.exact_match else []
+            if len(cuis) == 1:
+                linked[text] = (EXACT, [(cuis[0], 1.0)])
+            else:
+                pending.append(text)
+
+        keys = {text: cache_key(self.cache_namespace, text) for text in pending}
+        if self.cache is not None and pending:
+            cached = self.cache.get_many(keys.values())
+            still_pending = []
+            for text in pending:
+                if keys[text] in cached:
+                    predicted = [tuple(link) for link in cached[keys[text]]]
+                    linked[text] = (CACHED, predicted)
+                else:
+                    still_pending.append(text)
+            pending = still_pending
+
+        batch_candidates = self.candidate_generator(pending, self.k)
+        searched = {}
+        for text, candidates in zip(pending, batch_candidates):
+            linked[text] = (ANN, self._predict(candidates))
+            searched[keys[text]] = linked[text][1]
+        if self.cache is not None:
+            self.cache.put_many(searched)
+        return linked
+
+    def _link_docs(self, docs: List[Doc]):
+        mentions = [
+            (doc, mention, self._mention_text(mention))
+            for doc in docs
+            for mention in doc.ents
+        ]
+        linked = self.link(text for _, _, text in mentions)
+        for doc in docs:
+            doc._.link_stats = [0, 0, 0]
+        for doc, mention, text in mentions:
+            source, predicted = linked[text]
+            mention._.umls_ents = predicted
+            mention._.kb_ents = predicted
+            doc._.link_stats[source] += 1
+
+    def __call__(self, doc: Doc) -> Doc:
+        self._link_docs([doc])
+        return doc
+
+    def pipe(self, stream: Iterable[Doc], batch_size: int = 128) -> Iterator[Doc]:
+        for docs in minibatch(stream, size=batch_size):
+            self._link_docs(docs)
+            yield from docs
+
+
+def link_stats(n_exact: int, n_cached: int, n_ann: int) -> Dict[str, Union[int, float]]:
+    total = n_exact + n_cached + n_ann
+    return {
+        "exact": n_exact,
+        "cached": n_cached,
+        "ann": n_ann,
+        "hit_rate": (n_exact + n_cached) / total if total else 0.0,
+    }
@@ -1,7 +1,13 @@
+from bisect import bisect_left
+
+import numpy as np
+from more_itertools import chunked
+from spacy.attrs import HEAD, DEP, POS, LOWER
 from spacy.tokens import Span, Doc
 
 SUBJECTS = ["nsubj", "nsubjpass", "csubj", "csubjpass", "agent", "expl"]
 OBJECTS = ["dobj", "dative", "attr", "oprd"]
+NEGATIONS = ["no", "not", "n't", "never", "none"]
 
 
 def getSubsFromConjunctions(subs):
@@ -156,7 +162,6 @@ def findSVO(tokens):
     for v in verbs:
         subs, verbNegated = getAllSubs(v)
         # hopefully there are subs, if not, don't examine this verb any longer
-        subs.append(tokens)
         v, objs = getAllObjs(v)
         for sub in subs:
             for obj in objs:
@@ -169,6 +174,183 @@ def findSVO(tokens):
                 yield svo
 
 
+class _Groups:
+    """Token indices grouped by owner token, in CSR layout."""
+
+    def __init__(self, owners, members, n):
+        order = np.argsort(owners, kind="stable")
+        counts = np.bincount(owners, minlength=n)
+        self.members = members[order].tolist()
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+        self.has_members = (counts > 0).tolist()
+
+    def __getitem__(self, i):
+        return self.members[self.offsets[i] : self.offsets[i + 1]]
+
+
+class _DepArrays:
+    """Dependency arrays of a batch of docs, concatenated.
+
+    Label, part-of-speech and negation tests, and the subject and object
+    children of every token, are computed once for the whole batch with
+    NumPy. Only the walks up to a subject and along conjunctions are left
+    to Python."""
+
+    def __init__(self, docs):
+        strings = docs[0].vocab.strings
+        array = np.concatenate([doc.to_array([HEAD, DEP, POS, LOWER]) for doc in docs])
+        n = len(array)
+        self.offsets = np.cumsum([0] + [len(doc) for doc in docs]).tolist()
+        index = np.arange(n)
+        # Heads are stored as unsigned offsets
+        head = index + array[:, 0].astype(np.int64)
+        dep, pos, lower = array[:, 1], array[:, 2], array[:, 3]
+
+        def is_dep(*names):
+            return np.isin(dep, [strings[name] for name in names])
+
+        def is_pos(name):
+            return pos == strings[name]
+
+        def has_child(mask):
+            flags = np.zeros(n, dtype=bool)
+            flags[head[mask & is_child]] = True
+            return flags
+
+        def children(mask):
+            return _Groups(head[mask], index[mask], n)
+
+        is_child = head != index
+        is_left = is_child & (index < head)
+        is_right = is_child & (index > head)
+        is_verb = is_pos("VERB")
+        is_noun = is_pos("NOUN")
+        is_subject = is_dep(*SUBJECTS)
+        is_object = is_dep(*OBJECTS)
+        negation = np.isin(lower, [strings[word] for word in NEGATIONS])
+        conj = is_right & has_child(is_right & (lower == strings["and"]))[head]
+
+        # Objects of a verb: right children with an object label and the
+        # objects of its right prepositions
+        prep_objects = (
+            is_right
+            & (is_object | (is_pos("PRON") & (lower == strings["me"])))
+            & (is_pos("ADP") & is_dep("prep") & is_right)[head]
+        )
+        direct_objects = is_right & is_object
+        self.objects = _Groups(
+            np.concatenate([head[direct_objects], head[head[prep_objects]]]),
+            np.concatenate([index[direct_objects], index[prep_objects]]),
+            n,
+        )
+        # First right xcomp verb that has objects of its own, n if none
+        xcomps = is_right & is_verb & is_dep("xcomp")
+        xcomps &= np.array(self.objects.has_members)
+        xcomp = np.full(n, n)
+        np.minimum.at(xcomp, head[xcomps], index[xcomps])
+
+        self.n = n
+        self.strings = strings
+        self.head = head.tolist()
+        self.lower = lower.tolist()
+        self.xcomp = xcomp.tolist()
+        self.negated = has_child(negation).tolist()
+        self.is_verb = is_verb.tolist()
+        self.is_noun = is_noun.tolist()
+        # Only verbs with objects can yield triples
+        self.verbs = index[
+            is_verb
+            & ~is_dep("aux")
+            & (np.array(self.objects.has_members) | (xcomp < n))
+        ].tolist()
+        self.subjects = children(is_left & is_subject & ~is_pos("DET"))
+        self.subs = children(is_left & is_dep("SUB"))
+        self.sub_conj = children(conj & (is_subject | is_noun))
+        self.obj_conj = children(conj & (is_object | is_noun))
+
+    def conjunctions(self, tokens, edges):
+        """`tokens` and all tokens reachable from them over `edges`."""
+        frontier = [t for t in tokens if edges.has_members[t]]
+        if not frontier:
+            return tokens
+        reached = set(tokens)
+        while frontier:
+            frontier = [c for t in frontier for c in edges[t] if c not in reached]
+            reached.update(frontier)
+        return sorted(reached)
+
+    def text(self, i):
+        return self.strings[self.lower[i]]
+
+
+def _find_subs_arrays(arrays, tok):
+    head = arrays.head
+    h = head[tok]
+    while not arrays.is_verb[h] and not arrays.is_noun[h] and head[h] != h:
+        h = head[h]
+    if arrays.is_verb[h]:
+        subs = arrays.subs[h]
+        if len(subs) > 0:
+            return arrays.conjunctions(subs, arrays.sub_conj), arrays.negated[h]
+        elif head[h] != h:
+            return _find_subs_arrays(arrays, h)
+    elif arrays.is_noun[h]:
+        return [h], arrays.negated[tok]
+    return [], False
+
+
+def _svos_arrays(arrays, start, end):
+    svos = {}
+    verbs = arrays.verbs
+    for v in verbs[bisect_left(verbs, start) : bisect_left(verbs, end)]:
+        verb_negated = arrays.negated[v]
+        subs = arrays.subjects[v]
+        if subs:
+            subs = arrays.conjunctions(subs, arrays.sub_conj)
+        else:
+            subs, verb_negated = _find_subs_arrays(arrays, v)
+        if not subs:
+            continue
+        objs = arrays.objects[v]
+        xcomp = arrays.xcomp[v]
+        if xcomp < arrays.n:
+            objs += arrays.objects[xcomp]
+            v = xcomp
+        objs = arrays.conjunctions(objs, arrays.obj_conj)
+        verb = arrays.text(v)
+        for sub in subs:
+            for obj in objs:
+                negated = verb_negated or arrays.negated[obj]
+                svo = (
+                    arrays.text(sub),
+                    "!" + verb if negated else verb,
+                    arrays.text(obj),
+                )
+                svos[svo] = None
+    return list(svos)
+
+
+def findSVOArrays(tokens):
+    """Same triples as `findSVO`, without duplicates, computed from the
+    dependency arrays of the doc instead of token objects."""
+    if isinstance(tokens, Span):
+        arrays = _DepArrays([tokens.doc])
+        return _svos_arrays(arrays, tokens.start, tokens.end)
+    return _svos_arrays(_DepArrays([tokens]), 0, len(tokens))
+
+
+def findSVOsArrays(docs, batch_size=1000):
+    """`findSVOArrays` for every doc, with the arrays of `batch_size` docs
+    built at once. Yields `(doc, svos)`."""
+    for batch in chunked(docs, batch_size):
+        batch = [doc for doc in batch if len(doc)]
+        if not batch:
+            continue
+        arrays = _DepArrays(batch)
+        for doc, start, end in zip(batch, arrays.offsets, arrays.offsets[1:]):
+            yield doc, _svos_arrays(arrays, start, end)
+
+
 def printDeps(toks):
     for tok in toks:
         print(
@@ -1,61 +1,250 @@
+import os
 from logging import Logger
+from collections import Counter
 
-import spacy
-import networkx as nx
+from more_itertools import chunked
 
 from .spacy_pipeline import claucy, information_extractor  # noqa
+from .spacy_pipeline.information_extractor import (
+    CompactSpan,
+    deserialize_triples,
+    link_triples,
+)
+from .spacy_pipeline.artifact import build_pipeline, load_pipeline
+from .spacy_pipeline.linker import link_stats
+from .spacy_pipeline.doc_cache import ParsedDocCache
 from scispacy.linking import EntityLinker  # noqa
 
 logger = Logger(__name__)
 
 
-def triples_to_graph(triples) -> nx.Graph:
+class TripleGraph:
+    """Concept nodes and edges of one document.
 
-    G = nx.DiGraph()
+    Deduplicates like a `networkx.DiGraph` with `Span` nodes, but keys
+    nodes by their token offsets and stores edges in a dict, which avoids
+    hashing spans and the networkx adjacency structures."""
+
+    __slots__ = ("_nodes", "_edges")
+
+    def __init__(self):
+        self._nodes = {}
+        self._edges = {}
+
+    def add_node(self, span):
+        key = (span.start, span.end)
+        self._nodes.setdefault(key, span)
+        return key
+
+    def add_edge(self, start, end, **data):
+        key = (self.add_node(start), self.add_node(end))
+        self._edges.setdefault(key, {}).update(data)
+
+    @property
+    def nodes(self):
+        return list(self._nodes.values())
+
+    @property
+    def edges(self):
+        return [
+            (self._nodes[start], self._nodes[end], data)
+            for (start, end), data in self._edges.items()
+        ]
+
+    def is_empty(self):
+        return not self._edges
+
+
+def triples_to_graph(triples) -> TripleGraph:
+
+    G = TripleGraph()
     for triple in triples:
         if triple is None:
             continue
         if len(triple.subject.ents) == 0 or len(triple.object_.ents) == 0:
             continue
-        subjects = triple.subject
-        for subject in subjects.ents:
-            G.add_node(subject, node_type="concept", label=subject.text)
-        ordered_ents = (
-            subjects.ents.copy()
-        )  # TODO check that dependency tree is correct
-        ordered_ents.reverse()
-        for i in range(len(ordered_ents) - 1):
-            G.add_edge(ordered_ents[i], ordered_ents[i + 1], edge_type="_REL")
-        objects = triple.object_
-        for object_ in objects.ents:
-            G.add_node(object_, node_type="concept")
-            G.add_edge(
-                object_, subjects.ents[-1], edge_type="_VERB", name=triple.verb.text
-            )
+        subjects = triple.subject.ents
+        for subject in subjects:
+            G.add_node(subject)
+        # TODO check that dependency tree is correct
+        for i in range(len(subjects) - 1, 0, -1):
+            G.add_edge(subjects[i], subjects[i - 1], edge_type="_REL")
+        for object_ in triple.object_.ents:
+            G.add_edge(object_, subjects[-1], edge_type="_VERB", name=triple.verb.text)
     return G
 
 
-def _match_terms(records, nlp, name="conclusions"):
-    linker = nlp.get_pipe("scispacy_linker")
+def _with_context(records, pending):
+    # Only the index travels with the text, so that database entities
+    # are never pickled into `nlp.pipe` worker processes.
     for e, record in enumerate(records):
+        pending[e] = record
+        yield record.conclusion, e
+
+
+def _parse(records, nlp, batch_size=64, n_process=1, doc_cache=None):
+    if doc_cache is not None:
+        yield from _parse_cached(records, nlp, doc_cache, batch_size, n_process)
+        return
+    pending = {}
+    docs = nlp.pipe(
+        _with_context(records, pending),
+        as_tuples=True,
+        batch_size=batch_size,
+        n_process=n_process,
+    )
+    for doc, e in docs:
+        yield doc, pending.pop(e)
+
+
+def _apply(component, docs, batch_size=64):
+    if hasattr(component, "pipe"):
+        yield from component.pipe(docs, batch_size=batch_size)
+    else:
+        yield from (component(doc) for doc in docs)
+
+
+def _parse_cached(records, nlp, doc_cache, batch_size=64, n_process=1, chunk_size=1024):
+    """Like `_parse`, but only texts missing from `doc_cache` go through the
+    model. The rule-based components from `claucy` on run on every doc."""
+    downstream = nlp.pipe_names[nlp.pipe_names.index("claucy") :]
+    for chunk in chunked(records, chunk_size):
+        texts = [record.conclusion for record in chunk]
+        docs = doc_cache.get_many(nlp, texts)
+        missing = [text for text in dict.fromkeys(texts) if text not in docs]
+        with nlp.select_pipes(disable=downstream):
+            parsed = list(nlp.pipe(missing, batch_size=batch_size, n_process=n_process))
+        doc_cache.put_many(nlp, parsed)
+        docs.update(zip(missing, parsed))
+        # Repeated texts get their own copy, components write to the doc
+        chunk_docs = [docs[text].copy() for text in texts]
+        for name in downstream:
+            chunk_docs = _apply(nlp.get_pipe(name), chunk_docs, batch_size)
+        yield from zip(chunk_docs, chunk)
+
+
+def _is_confident(triples):
+    """Every clause produced a triple with entities on both sides."""
+    return bool(triples) and all(
+        triple is not None
+        and triple.object_ is not None
+        and triple.subject.ents
+        and triple.object_.ents
+        for triple in triples
+    )
+
+
+def _triple_keys(triples):
+    return {
+        (triple.subject.text, triple.verb.text, triple.object_.text)
+        for triple in triples
+        if triple is not None and triple.object_ is not None
+    }
+
+
+def _cascade(
+    records,
+    cheap_nlp,
+    nlp,
+    batch_size=64,
+    n_process=1,
+    agreement_sample=0.05,
+    chunk_size=1024,
+    doc_cache=None,
+):
+    """Parse with `cheap_nlp` first and re-parse with `nlp` only the
+    sentences it is not confident about. A share of `agreement_sample` of
+    the confident sentences is re-parsed as well, to measure how often
+    both models extract the same triples."""
+    linker = nlp.get_pipe("scispacy_linker")
+    stats = Counter()
+    for chunk in chunked(records, chunk_size):
+        accepted, escalated, sampled = [], [], {}
+        cheap_parsed = _parse(chunk, cheap_nlp, batch_size, n_process, doc_cache)
+        for doc, record in cheap_parsed:
+            stats["sentences"] += 1
+            triples = deserialize_triples(doc)
+            if not _is_confident(triples):
+                escalated.append(record)
+                continue
+            stats["accepted"] += 1
+            n = stats["accepted"]
+            if int(n * agreement_sample) > int((n - 1) * agreement_sample):
+                sampled[len(escalated)] = _triple_keys(triples)
+                escalated.append(record)
+                continue
+            accepted.append((doc, record))
+        docs = _apply(linker, (doc for doc, _ in accepted), batch_size=batch_size)
+        yield from zip(docs, (record for _, record in accepted))
+
+        parsed = _parse(escalated, nlp, batch_size, n_process, doc_cache)
+        for i, (doc, record) in enumerate(parsed):
+            if i in sampled:
+                cheap_keys = sampled[i]
+                keys = _triple_keys(deserialize_triples(doc))
+                stats["sampled"] += 1
+                stats["agreed"] += cheap_keys == keys
+                stats["jaccard"] += len(cheap_keys & keys) / len(cheap_keys | keys)
+            yield doc, record
+
+    if stats["sentences"]:
+        logger.info(
+            f"Cascade: cheap model was confident on {stats['accepted']} of "
+            f"{stats['sentences']} sentences "
+            f"({stats['accepted'] / stats['sentences']:.1%})."
+        )
+    if stats["sampled"]:
+        logger.info(
+            f"Cascade agreement on {stats['sampled']} sampled sentences: "
+            f"{stats['agreed'] / stats['sampled']:.1%} identical triples, "
+            f"mean Jaccard {stats['jaccard'] / stats['sampled']:.2f}."
+        )
+
+
+def _match_terms(parsed, linker, known_cuis=None):
+    seen_cuis = set(known_cuis or ())
+    n_linked = [0, 0, 0]
+    for doc, record in parsed:
         doi = record.summary_id.article_id.doi
         summary_id = record.summary_id
-        doc = nlp(record.conclusion)
-        if not doc._.triples:
+        if doc._.link_stats is not None:
+            n_linked = [total + n for total, n in zip(n_linked, doc._.link_stats)]
+        triples = deserialize_triples(doc)
+        # Every conclusion yields an element, so that the writer can tell
+        # when all of its rows are committed, see `ProgressTracker`
+        elem = {"upstream_id": record.id, "nodes": [], "edges": [], "mentions": []}
+        if not triples:
+            yield elem
             continue
-        staging_graph = triples_to_graph(doc._.triples)
-        if nx.is_empty(staging_graph):
+        link_triples(doc)
+        staging_graph = triples_to_graph(triples)
+        if staging_graph.is_empty():
+            yield elem
             continue
-        graph_nodes = list(staging_graph.nodes)
-        node_objs = _to_nodes(graph_nodes, linker, summary_id)
-        graph_edges = list(staging_graph.edges(data=True))
-        edge_objs = _to_edges(graph_edges, record, doi)
-        yield {"nodes": node_objs, "edges": edge_objs}
+        graph_nodes = staging_graph.nodes
+        elem["mentions"] = list(_to_mentions(graph_nodes, summary_id))
+        elem["nodes"] = list(_to_nodes(graph_nodes, linker, summary_id, seen_cuis))
+        graph_edges = staging_graph.edges
+        elem["edges"] = _to_edges(graph_edges, record, doi)
+        yield elem
+    if any(n_linked):
+        stats = link_stats(*n_linked)
+        logger.info(
+            f"Linked {stats['exact']} mentions by exact match, {stats['cached']} "
+            f"from cache and {stats['ann']} by ANN search "
+            f"(hit rate {stats['hit_rate']:.1%})."
+        )
+
+
+def _kb_ents(span):
+    if isinstance(span, CompactSpan):
+        return span.kb_ents
+    return span._.kb_ents
 
 
 def _predicate_edge(start, end, data, record, doi):
-    for start_cui, _ in start._.kb_ents:
-        for end_cui, _ in end._.kb_ents:
+    for start_cui, _ in _kb_ents(start):
+        for end_cui, _ in _kb_ents(end):
             edge_data = {
                 "summary_id": record.summary_id,
                 "node_left": start_cui,
@@ -64,16 +253,15 @@ def _predicate_edge(start, end, data, record, doi):
                 "attributes": {
                     "name": data["name"],
                     "doi": doi,
-                    "conclusion": record.conclusion,
-                    "summary": record.summary_id.summary,
+                    "conclusion_id": record.id,
                 },
             }
             yield edge_data
 
 
 def _relational_edge(start, end, data, record, doi):
-    for start_cui, _ in start._.kb_ents:
-        for end_cui, _ in end._.kb_ents:
+    for start_cui, _ in _kb_ents(start):
+        for end_cui, _ in _kb_ents(end):
             edge_data = {
                 "summary_id": record.summary_id,
                 "node_left": start_cui,
@@ -107,10 +295,21 @@ def _to_edges(graph_edges, record, doi):
         yield from converter(start, end, data, record, doi)
 
 
-def _to_nodes(graph_nodes, linker, summary_id):
+def _to_mentions(graph_nodes, summary_id):
+    cuis = {cui for node in graph_nodes for cui, _ in _kb_ents(node)}
+    for cui in sorted(cuis):
+        yield {"summary_id": summary_id, "cui": cui}
+
+
+def _to_nodes(graph_nodes, linker, summary_id, seen_cuis):
+    """Concept and synonym nodes for every CUI not in `seen_cuis`, which is
+    updated in place so that every concept is emitted only once per run."""
     for node in graph_nodes:
-        for concept in node._.kb_ents:
+        for concept in _kb_ents(node):
             cui = concept[0]
+            if cui in seen_cuis:
+                continue
+            seen_cuis.add(cui)
             node_data = linker.kb.cui_to_entity[cui]
             node = {
                 "summary_id": summary_id,
@@ -133,28 +332,89 @@ def _to_nodes(graph_nodes, linker, summary_id):
                 yield synonym_node
 
 
-def extract_triples(simplified_summaries, spacy_model="en_core_sci_scibert"):
-    allowed_models = [
-        "en_core_sci_sm",
-        "en_core_sci_md",
-        "en_core_sci_lg",
-        "en_core_sci_scibert",
-    ]
-    if spacy_model not in allowed_models:
-        raise ValueError(
-            f"Model '{spacy_model}' is not applicable for this task."
-            + f"Allowed models are: '{', '.join(allowed_models)}'."
+def extract_triples(
+    simplified_summaries,
+    spacy_model="en_core_sci_scibert",
+    batch_size=64,
+    n_process=1,
+    pipeline_path=None,
+    known_cuis=None,
+    link_cache_path=None,
+    cascade_model=None,
+    agreement_sample=0.05,
+    doc_cache_path=None,
+    compact=True,
+):
+    """Extract concept nodes and edges from the conclusions.
+
+    Conclusions are streamed through `nlp.pipe` in batches of `batch_size`
+    on `n_process` processes. With more than one process, triples are
+    serialized to token offsets in the workers and rebuilt here.
+
+    If `pipeline_path` (or `$NLP_PIPELINE_PATH`) points to a pipeline built
+    with `stages.spacy_pipeline.artifact`, it is loaded instead of
+    assembling `spacy_model` from scratch. Its linker caches mention links
+    across runs in `link_cache_path` (or `$LINK_CACHE_PATH`).
+
+    Every concept is written once, together with its synonyms, and linked
+    to conclusions through mentions. Pass the CUIs already in the database
+    as `known_cuis` to skip them entirely.
+
+    With a `cascade_model` such as `en_core_sci_sm`, every conclusion is
+    parsed with that model first and only those without triples, or with
+    triples lacking entities, are parsed again with the main model. A share
+    of `agreement_sample` of the others is parsed by both to report how
+    often they agree.
+
+    Parsed docs are cached in `doc_cache_path` (or `$DOC_CACHE_PATH`), so
+    that re-runs only parse new texts and run the rule-based components.
+
+    With `compact`, triples are kept as `CompactTriple`s and every doc drops
+    its transformer output and clauses as soon as its triples are
+    extracted, so that memory does not grow with `batch_size`."""
+    pipeline_path = pipeline_path or os.getenv("NLP_PIPELINE_PATH")
+    if pipeline_path:
+        nlp = load_pipeline(
+            pipeline_path,
+            link_cache_path=link_cache_path or os.getenv("LINK_CACHE_PATH"),
+        )
+    else:
+        nlp = build_pipeline(spacy_model)
+    nlp.get_pipe("InformationExtractor").compact = compact
+    if n_process != 1:
+        nlp.add_pipe("TripleSerializer", last=True)
+    logger.info(f"NLP loaded, using pipeline {nlp.pipe_names}.")
+    doc_cache_path = doc_cache_path or os.getenv("DOC_CACHE_PATH")
+    doc_cache = ParsedDocCache(doc_cache_path) if doc_cache_path else None
+    if cascade_model:
+        cheap_nlp = build_pipeline(cascade_model, linker=False)
+        cheap_nlp.get_pipe("InformationExtractor").compact = compact
+        if n_process != 1:
+            cheap_nlp.add_pipe("TripleSerializer", last=True)
+        parsed = _cascade(
+            simplified_summaries,
+            cheap_nlp,
+            nlp,
+            batch_size=batch_size,
+            n_process=n_process,
+            agreement_sample=agreement_sample,
+            doc_cache=doc_cache,
         )
-    nlp = spacy.load(spacy_model)
-    nlp.add_pipe("claucy")
-    nlp.add_pipe("InformationExtractor", after="claucy")
-    nlp.add_pipe(
-        "scispacy_linker",
-        config={
-            "resolve_abbreviations": False,
-            "linker_name": "umls",
-            "max_entities_per_mention": 1,
-        },
+    else:
+        parsed = _parse(
+            simplified_summaries,
+            nlp,
+            batch_size=batch_size,
+            n_process=n_process,
+            doc_cache=doc_cache,
+        )
+    yield from _match_terms(
+        parsed, nlp.get_pipe("scispacy_linker"), known_cuis=known_cuis
     )
-    logger.info(f"NLP loaded, using model '{spacy_model}'.")
-    yield from _match_terms(simplified_summaries, nlp)
+    if doc_cache is not None:
+        stats = doc_cache.stats
+        logger.info(
+            f"Parsed doc cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"(hit rate {stats['hit_rate']:.1%})."
+        )
+        doc_cache.close()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Stand-in for the MetaMap binary, reading blank-line separated documents
+from stdin and writing one `--JSONn` document per input to stdout.
+
+Behaviour is scripted through environment variables:
+
+    FAKE_METAMAP_CRASH_FILE     exit with an error on the next document if
+                                this file exists (the file is removed first)
+    FAKE_METAMAP_EMPTY          answer every document with an empty result
+    FAKE_METAMAP_DELAY          seconds to sleep before every answer
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import itertools
+
+
+def _phrase(word):
+    cui = "C%07d" % (zlib.crc32(word.lower().encode()) % 10_000_000)
+    candidate = {
+        "CandidateMatched": word,
+        "CandidatePreferred": word.title(),
+        "CandidateCUI": cui,
+    }
+    return {"PhraseText": word, "Mappings": [{"MappingCandidates": [candidate]}]}
+
+
+def _answer(text):
+    if os.getenv("FAKE_METAMAP_EMPTY"):
+        return {"AllDocuments": []}
+    phrases = [_phrase(word.strip(".,;")) for word in text.split()]
+    utterance = {"UttText": text, "Phrases": phrases}
+    return {"AllDocuments": [{"Document": {"Utterances": [utterance]}}]}
+
+
+def main():
+    sys.stdout.write("/opt/public_mm/bin/SKRrun.20 fake MetaMap\n")
+    sys.stdout.flush()
+    crash_file = os.getenv("FAKE_METAMAP_CRASH_FILE")
+    delay = float(os.getenv("FAKE_METAMAP_DELAY", 0))
+    lines = []
+    for line in itertools.chain(sys.stdin, [""]):
+        if line.strip():
+            lines.append(line.strip())
+            continue
+        if not lines:
+            continue
+        if crash_file and os.path.exists(crash_file):
+            os.remove(crash_file)
+            sys.stderr.write("Fatal error in fake MetaMap\n")
+            sys.exit(1)
+        time.sleep(delay)
+        sys.stdout.write(json.dumps(_answer(" ".join(lines))))
+        sys.stdout.flush()
+        lines = []
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+from stages.cache import PersistentCache, cache_key
+
+
+def test_bulk_lookup_and_stats(tmp_path):
+    cache = PersistentCache(tmp_path / "cache.db")
+    cache.put_many({cache_key("2018AB", "aspirin"): [{"cui": "C0004057"}]})
+    found = cache.get_many([cache_key("2018AB", "aspirin"), cache_key("2018AB", "x")])
+    assert list(found.values()) == [[{"cui": "C0004057"}]]
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_persists_across_instances(tmp_path):
+    PersistentCache(tmp_path / "cache.db").put_many({"a": 1})
+    assert PersistentCache(tmp_path / "cache.db").get("a") == 1
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PersistentCache(tmp_path / "cache.db", max_entries=2)
+    cache.put_many({"a": 1})
+    cache.put_many({"b": 2})
+    cache.get("a")
+    cache.put_many({"c": 3})
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats["evictions"] == 1
+
+
+def test_counts_entries_without_scanning(tmp_path, monkeypatch):
+    cache = PersistentCache(tmp_path / "cache.db", max_entries=3)
+    monkeypatch.setattr(PersistentCache, "__len__", lambda self: 1 / 0)
+    cache.put_many({"a": 1, "b": 2})
+    cache.put_many({"a": 3, "c": 4})
+    assert cache._n_entries == 3
+    monkeypatch.undo()
+    cache.put_many({"d": 5})
+    assert len(cache) == 3
+    assert cache.stats["evictions"] == 1
+
+
+def test_evicts_below_limit(tmp_path, monkeypatch):
+    cache = PersistentCache(tmp_path / "cache.db", max_entries=10)
+    cache.put_many({str(i): i for i in range(11)})
+    assert len(cache) == 9
+    assert cache.stats["evictions"] == 2
+    # The next insert stays within the limit without recounting
+    monkeypatch.setattr(PersistentCache, "__len__", lambda self: 1 / 0)
+    cache.put_many({"new": 1})
+    assert cache.stats["evictions"] == 2
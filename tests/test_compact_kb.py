@@ -0,0 +1,70 @@
+import pickle
+
+from scispacy.linking_utils import Entity
+
+from stages.spacy_pipeline.compact_kb import CompactKnowledgeBase
+from stages.spacy_pipeline.linker import ANN, EXACT, BatchEntityLinker
+
+
+class _KnowledgeBase:
+    def __init__(self, entities):
+        self.cui_to_entity = {entity.concept_id: entity for entity in entities}
+        self.alias_to_cuis = {}
+        for entity in entities:
+            for alias in set(entity.aliases) | {entity.canonical_name}:
+                self.alias_to_cuis.setdefault(alias, set()).add(entity.concept_id)
+
+
+ENTITIES = [
+    Entity("C0004057", "Aspirin", ["ASA", "acetylsalicylic acid"], ["T109"], "NSAID"),
+    Entity("C0020538", "Hypertension", ["high blood pressure"], ["T047"]),
+    Entity("C0001416", "Adenosine", ["ADO", "ASA"], ["T114", "T121"], "Nucleoside"),
+]
+
+
+def test_lookup_matches_source(tmp_path):
+    source = _KnowledgeBase(ENTITIES)
+    kb = CompactKnowledgeBase.build(source, tmp_path, ann_aliases=["ASA", "Aspirin"])
+    for cui, entity in source.cui_to_entity.items():
+        assert kb.cui_to_entity[cui] == entity
+    for alias, cuis in source.alias_to_cuis.items():
+        assert kb.alias_to_cuis[alias] == cuis
+    assert "C9999999" not in kb.cui_to_entity
+    assert "aspirin" not in kb.alias_to_cuis
+    assert list(kb.ann_aliases) == ["ASA", "Aspirin"]
+
+
+def test_reopens_from_disk_when_pickled(tmp_path):
+    CompactKnowledgeBase.build(_KnowledgeBase(ENTITIES), tmp_path)
+    kb = pickle.loads(pickle.dumps(CompactKnowledgeBase(tmp_path)))
+    assert kb.cui_to_entity["C0020538"].definition is None
+    assert len(kb.cui_to_entity) == 3
+
+
+def test_exact_match_is_case_and_whitespace_insensitive(tmp_path):
+    kb = CompactKnowledgeBase.build(_KnowledgeBase(ENTITIES), tmp_path)
+    assert kb.exact_match("High  Blood pressure") == ["C0020538"]
+    assert kb.exact_match("asa") == ["C0001416", "C0004057"]
+    assert kb.exact_match("blood pressure") == []
+
+
+def test_linker_searches_ambiguous_aliases(tmp_path):
+    linker = BatchEntityLinker.__new__(BatchEntityLinker)
+    linker.kb = CompactKnowledgeBase.build(_KnowledgeBase(ENTITIES), tmp_path)
+    linker.exact_match = True
+    linker.cache_path = None
+    linker.cache_namespace = ""
+    linker._cache = None
+    searched = []
+
+    def candidate_generator(texts, k):
+        searched.extend(texts)
+        return [[] for _ in texts]
+
+    linker.candidate_generator = candidate_generator
+    linker.k = 30
+    linker.max_entities_per_mention = 1
+    linked = linker.link(["high blood pressure", "ASA"])
+    assert linked["high blood pressure"] == (EXACT, [("C0020538", 1.0)])
+    assert linked["ASA"][0] == ANN
+    assert searched == ["ASA"]
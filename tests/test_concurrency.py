@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from stages.concurrency import sliding_window, restore_order
+
+
+async def _sleep(delay):
+    await asyncio.sleep(delay)
+    return delay
+
+
+def _collect(agen_factory):
+    async def run():
+        return [scheduled async for scheduled in agen_factory()]
+
+    return asyncio.run(run())
+
+
+def test_slow_call_does_not_block_window():
+    delays = [1.0] + [0.05] * 20
+
+    start = time.monotonic()
+    results = _collect(lambda: sliding_window(_sleep, delays, concurrency=4))
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 1.5
+    assert results[-1].index == 0
+    assert sorted(r.index for r in results) == list(range(len(delays)))
+
+
+def test_timeout_cancels_call():
+    results = _collect(lambda: sliding_window(_sleep, [0.01, 5], timeout=0.2))
+    by_index = {r.index: r.result for r in results}
+    assert by_index[0] == 0.01
+    assert isinstance(by_index[1], asyncio.TimeoutError)
+
+
+def test_restore_order():
+    delays = [0.2, 0.01, 0.1, 0.05]
+    results = _collect(lambda: sliding_window(_sleep, delays, concurrency=4))
+    assert [r.index for r in results] != list(range(len(delays)))
+    assert [r.result for r in restore_order(results)] == delays
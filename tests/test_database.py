@@ -109,6 +109,17 @@ RETURN RELATIONSHIPS(p) as edges, NODES(p) as nodes""" % (
     assert len(edges) * 2 >= len(nodes)
 
 
+def test_verb_edge_links_conclusion(graph_db):
+    stmt = """MATCH ()-[r:`_VERB`]->()
+WHERE r.conclusion_id IS NOT NULL
+MATCH (c:conclusion {conclusion_id: r.conclusion_id})
+RETURN r.name AS name, c.conclusion AS conclusion LIMIT 1"""
+    results = graph_db.query(stmt, out="list")
+    assert len(results) == 1
+    assert results[0]["name"]
+    assert results[0]["conclusion"]
+
+
 def run_tests():
     res = pytest.main(["tests/test_database.py"])
 
@@ -0,0 +1,20 @@
+from models.db_tables import PredicateEdge
+from stages.graph_preparer import stage_edges
+
+
+def _columns(table):
+    return {attr.name for attr in table._attrs_ if not attr.is_pk}
+
+
+def test_staged_edges_match_predicate_edges():
+    row = {
+        "edge_id": 1,
+        "name": "prevents",
+        "doi": "10.1000/1",
+        "summary": "Aspirin prevents heart attacks in adults.",
+        "conclusion": "Aspirin prevents heart attacks.",
+        "cui_left": "C0004057",
+        "cui_right": "C0027051",
+    }
+    (predicate_edge,) = stage_edges([row])
+    assert set(predicate_edge) == _columns(PredicateEdge)
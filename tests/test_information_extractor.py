@@ -0,0 +1,92 @@
+import gc
+from types import SimpleNamespace
+
+import spacy
+from spacy.tokens import Doc, Span
+
+import stages.spacy_pipeline.claucy
+
+from stages.spacy_pipeline.information_extractor import (
+    CompactTriple,
+    Triple,
+    _TermAutomaton,
+    _match_indexes,
+    link_triples,
+)
+
+
+def test_automaton_finds_first_occurrence_of_overlapping_terms():
+    automaton = _TermAutomaton(["heart attack", "attack", "art", "stroke"])
+    found = automaton.first_occurrences("a heart attack after an attack")
+    assert found == {"heart attack": 2, "art": 4, "attack": 8}
+
+
+def test_match_is_case_insensitive_and_counts_covered_tokens():
+    doc = spacy.blank("en")("Aspirin prevents Heart Attack in patients")
+    triple = Triple(subject=doc[0:1], verb=doc[1:2], object_=doc[2:6])
+    aspirin = SimpleNamespace(matched_term="aspirin", idx=None)
+    heart_attack = SimpleNamespace(matched_term="heart attack", idx=None)
+    triple.match([aspirin, heart_attack])
+    assert triple.subject_nes == [aspirin]
+    assert triple.object_nes == [heart_attack, heart_attack]
+    assert heart_attack.idx == 17
+    # The shared index does not keep the doc alive
+    del doc, triple
+    gc.collect()
+    assert len(_match_indexes) == 0
+
+
+def test_compact_triple_keeps_offsets_and_links_without_doc():
+    if not Span.has_extension("kb_ents"):
+        Span.set_extension("kb_ents", default=[])
+    nlp = spacy.blank("en")
+    nlp.add_pipe("InformationExtractor", config={"compact": True})
+    doc = nlp.make_doc("Aspirin prevents heart attacks")
+    doc.ents = [Span(doc, 0, 1, "ENTITY"), Span(doc, 2, 4, "ENTITY")]
+    doc.ents[1]._.kb_ents = [("C0027051", 0.9)]
+    triple = CompactTriple.from_triple(Triple(doc[0:1], doc[1:2], doc[2:4]))
+    doc._.triples = [triple]
+    link_triples(doc)
+    assert not hasattr(triple, "__dict__")
+    (heart_attacks,) = triple.object_.ents
+    assert (heart_attacks.start, heart_attacks.end) == (2, 4)
+    assert (heart_attacks.start_char, heart_attacks.end_char) == (17, 30)
+    assert heart_attacks.text == "heart attacks"
+    assert heart_attacks.kb_ents == [("C0027051", 0.9)]
+    assert triple.subject.ents[0].kb_ents == []
+    assert triple.verb.text == "prevents"
+
+
+def _parsed_doc(nlp):
+    words = "Aspirin prevents heart attacks and lowers the risk . Pain decreases ."
+    doc = Doc(
+        nlp.vocab,
+        words=words.split(),
+        heads=[1, 1, 3, 1, 1, 1, 7, 5, 1, 10, 10, 10],
+        deps=["nsubj", "ROOT", "compound", "dobj", "cc", "conj", "det", "dobj"]
+        + ["punct", "nsubj", "ROOT", "punct"],
+        pos=["NOUN", "VERB", "NOUN", "NOUN", "CCONJ", "VERB", "DET", "NOUN"]
+        + ["PUNCT", "NOUN", "VERB", "PUNCT"],
+        tags=["NN", "VBZ", "NN", "NNS", "CC", "VBZ", "DT", "NN", ".", "NN", "VBZ", "."],
+        lemmas=words.lower().split(),
+        sent_starts=[1, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0],
+        ents=["B-E", "O", "B-E", "I-E"] + ["O"] * 8,
+    )
+    for _, component in nlp.pipeline:
+        doc = component(doc)
+    return doc
+
+
+def test_compact_triples_match_full_triples():
+    triples = {}
+    for compact in (False, True):
+        nlp = spacy.blank("en")
+        nlp.add_pipe("claucy")
+        nlp.add_pipe("InformationExtractor", config={"compact": compact})
+        triples[compact] = [
+            triple and (triple.subject.text, triple.verb.text, triple.object_.text)
+            for triple in _parsed_doc(nlp)._.triples
+        ]
+    # The intransitive clause has no triple, in both modes
+    assert triples[True] == triples[False]
+    assert triples[False][-1] is None
@@ -0,0 +1,90 @@
+import sys
+import time
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from stages.metamap import MetaMapPool, MetaMapError
+from stages.extract_ner import _metamap_call
+
+FAKE_METAMAP = [sys.executable, str(Path(__file__).parent / "fake_metamap.py")]
+
+
+def _annotate(pool, batches):
+    async def run():
+        async with pool:
+            return await asyncio.gather(*[pool.annotate(batch) for batch in batches])
+
+    return asyncio.run(run())
+
+
+def _text(document):
+    return document["AllDocuments"][0]["Document"]["Utterances"][0]["UttText"]
+
+
+def test_pool_keeps_input_order():
+    batches = [[f"Text {i} of batch {b}." for i in range(5)] for b in range(6)]
+    pool = MetaMapPool(size=3, cmd=FAKE_METAMAP, timeout=10)
+    results = _annotate(pool, batches)
+    for batch, documents in zip(batches, results):
+        assert [_text(document) for document in documents] == batch
+
+
+def test_pool_restarts_crashed_worker(tmp_path, monkeypatch):
+    crash_file = tmp_path / "crash"
+    monkeypatch.setenv("FAKE_METAMAP_CRASH_FILE", str(crash_file))
+    pool = MetaMapPool(size=1, cmd=FAKE_METAMAP, timeout=10)
+
+    async def run():
+        async with pool:
+            crash_file.touch()
+            return await pool.annotate(["Aspirin reduces pain."])
+
+    documents = asyncio.run(run())
+    assert _text(documents[0]) == "Aspirin reduces pain."
+    assert pool.n_restarts == 1
+
+
+def test_pool_times_out_slow_worker(monkeypatch):
+    monkeypatch.setenv("FAKE_METAMAP_DELAY", "2")
+    pool = MetaMapPool(size=1, cmd=FAKE_METAMAP, timeout=0.5)
+    with pytest.raises(MetaMapError):
+        _annotate(pool, [["Too slow."]])
+
+
+def test_pool_rejects_empty_output(monkeypatch):
+    monkeypatch.setenv("FAKE_METAMAP_EMPTY", "1")
+    pool = MetaMapPool(size=1, cmd=FAKE_METAMAP, timeout=10)
+    with pytest.raises(MetaMapError):
+        _annotate(pool, [["No tagger server."]])
+
+
+def _is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Killed processes can linger as zombies until they are reaped
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_timed_out_call_kills_metamap(tmp_path, monkeypatch):
+    pid_file = tmp_path / "pid"
+    metamap = tmp_path / "bin" / "metamap"
+    metamap.parent.mkdir()
+    metamap.write_text(
+        f"#!/bin/sh\necho $$ > {pid_file}\nexec {' '.join(FAKE_METAMAP)}\n"
+    )
+    metamap.chmod(0o755)
+    monkeypatch.setenv("METAMAP_PATH", str(tmp_path))
+    monkeypatch.setenv("FAKE_METAMAP_DELAY", "60")
+    record = SimpleNamespace(id=1, conclusion="Aspirin reduces pain.")
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(_metamap_call(record), timeout=1))
+    pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while _is_running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _is_running(pid)
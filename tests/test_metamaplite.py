@@ -0,0 +1,103 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from stages.metamaplite import MetaMapLiteClient, MetaMapLiteError, TokenBucket
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers like MetaMapLite, failing the first `fail_first` requests
+    for every text with the configured status code."""
+
+    fail_status = 429
+    fail_first = 0
+    seen = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        form = parse_qs(self.rfile.read(length).decode())
+        text = form["inputtext"][0]
+        n_seen = self.seen.get(text, 0)
+        self.seen[text] = n_seen + 1
+        if n_seen < self.fail_first:
+            self.send_response(self.fail_status)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        body = json.dumps(
+            [
+                {
+                    "matchedtext": text,
+                    "evlist": [
+                        {"conceptinfo": {"preferredname": text.title(), "cui": "C1"}}
+                    ],
+                }
+            ]
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    StandInHandler.seen = {}
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/annotate"
+    httpd.shutdown()
+
+
+def _run(client, coro_factory):
+    async def run():
+        async with client:
+            return await coro_factory()
+
+    return asyncio.run(run())
+
+
+def test_batch_keeps_order(server):
+    texts = [f"text {i}" for i in range(20)]
+    client = MetaMapLiteClient(url=server, rate=1000, burst=1000)
+    results = _run(client, lambda: client.annotate_batch(texts))
+    assert [result[0]["matchedtext"] for result in results] == texts
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retries_on_throttling_and_server_errors(server, monkeypatch, status):
+    monkeypatch.setattr(StandInHandler, "fail_status", status)
+    monkeypatch.setattr(StandInHandler, "fail_first", 2)
+    client = MetaMapLiteClient(url=server, rate=1000, burst=1000)
+    result = _run(client, lambda: client.annotate("aspirin"))
+    assert result[0]["matchedtext"] == "aspirin"
+    assert client.n_retries == 2
+
+
+def test_gives_up_after_max_retries(server, monkeypatch):
+    monkeypatch.setattr(StandInHandler, "fail_first", 10)
+    client = MetaMapLiteClient(url=server, rate=1000, burst=1000, max_retries=2)
+    with pytest.raises(MetaMapLiteError):
+        _run(client, lambda: client.annotate("aspirin"))
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+
+    async def run():
+        for _ in range(11):
+            await bucket.acquire()
+
+    start = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - start >= 0.45
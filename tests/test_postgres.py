@@ -0,0 +1,181 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from pony.orm import select
+
+from connectors.postgres import Database
+from models.db_tables import SimpleConclusions, Summary
+from utils.run_modes import RunModes
+
+
+@pytest.fixture
+def postgres_db():
+    db = Database.from_config(path="config/dev.json", key="postgres")
+    return db
+
+
+class FakeQuery:
+    def _construct_sql_and_arguments(self):
+        sql = 'SELECT "c"."id" FROM "summaries" "c" WHERE "c"."id" < %(p1)s'
+        return sql, {"p1": 100}, None, None
+
+
+def test_stream_records_passes_query_parameters():
+    db = Database.__new__(Database)
+    db._build_query = lambda **kwargs: FakeQuery()
+    streamed = []
+
+    def stream_raw(stmt, batch_size, params, named):
+        streamed.append((stmt, params))
+        yield from ()
+
+    db._stream_raw = stream_raw
+    list(db._stream_records(Summary, RunModes.ALL, None, None, 7, 10))
+    ((stmt, params),) = streamed
+    assert '"c"."id" < %(p1)s' in stmt
+    assert params == {"p1": 100, "after_id": 7}
+
+
+def test_stream_survives_commits(postgres_db):
+    with postgres_db.session_handler():
+        rows = postgres_db._stream_raw("SELECT generate_series(1, 5)", batch_size=2)
+        seen = []
+        for (n,) in rows:
+            seen.append(n)
+            # Commits the transaction the cursor was opened in
+            postgres_db._execute_raw("SELECT 1")
+    assert seen == [1, 2, 3, 4, 5]
+
+
+def test_stage_nodes_dry_run_writes_nothing(postgres_db):
+    with postgres_db.session_handler():
+        n_concepts = postgres_db.concept_nodes.select().count()
+    staged = postgres_db.stage_nodes(dry_run=True)
+    assert set(staged) == {"concept_nodes", "synonym_nodes"}
+    with postgres_db.session_handler():
+        assert postgres_db.concept_nodes.select().count() == n_concepts
+
+
+def test_restage_counts_every_concept(postgres_db):
+    with postgres_db.session_handler():
+        n_staged = postgres_db.concept_nodes.select().count()
+        nodes = postgres_db.nodes
+        cuis = select(n.cui_or_name for n in nodes if n.node_type == "concept")
+        n_cuis = cuis.distinct().count()
+    staged = postgres_db.stage_nodes(restage=True, dry_run=True)
+    assert staged["concept_nodes"] == n_cuis
+    with postgres_db.session_handler():
+        assert postgres_db.concept_nodes.select().count() == n_staged
+
+
+def test_newer_refuses_without_watermark_for_unrelated_tables():
+    db = Database.__new__(Database)
+    db.get_watermark = lambda table, downstream: None
+    with pytest.raises(ValueError, match="run mode ALL"):
+        db._get_newer_records(Summary, [SimpleConclusions, Summary])
+
+
+def test_newer_seeds_from_summaries_without_triples(postgres_db, monkeypatch):
+    monkeypatch.setattr(postgres_db, "get_watermark", lambda table, downstream: None)
+    downstream = [postgres_db.nodes, postgres_db.edges, postgres_db.mentions]
+    with postgres_db.session_handler():
+        query = postgres_db._get_newer_records(
+            postgres_db.simple_substituted_conclusions, downstream
+        )
+        for conclusion in query:
+            summary = conclusion.summary_id
+            assert summary.nodes.is_empty()
+            assert summary.edges.is_empty()
+            assert summary.mentions.is_empty()
+
+
+class Table:
+    def __init__(self):
+        self._table_ = ("test", uuid.uuid4().hex)
+
+
+@pytest.fixture
+def watermark_tables(postgres_db):
+    tables = Table(), Table()
+    yield tables
+    upstream = ".".join(tables[0]._table_)
+    with postgres_db.session_handler():
+        postgres_db.watermarks.select(lambda w: w.upstream == upstream).delete(
+            bulk=True
+        )
+
+
+def test_watermark_only_moves_forward(postgres_db, watermark_tables):
+    upstream, downstream = watermark_tables
+    postgres_db.save_watermark(upstream, downstream, datetime(2022, 3, 2), 5)
+    postgres_db.save_watermark(upstream, downstream, datetime(2022, 3, 1), 9)
+    postgres_db.save_watermark(upstream, downstream, datetime(2022, 3, 2), 4)
+    with postgres_db.session_handler():
+        watermark = postgres_db.get_watermark(upstream, downstream)
+    assert watermark == (datetime(2022, 3, 2), 5)
+    postgres_db.save_watermark(upstream, downstream, datetime(2022, 3, 2), 6)
+    with postgres_db.session_handler():
+        watermark = postgres_db.get_watermark(upstream, downstream)
+    assert watermark == (datetime(2022, 3, 2), 6)
+
+
+def test_newer_reads_after_watermark(postgres_db, monkeypatch):
+    with postgres_db.session_handler():
+        first = postgres_db.summaries.select().order_by(lambda s: s.id).first()
+        if first is None:
+            pytest.skip("Needs a summary")
+        date_added, id_ = first.date_added, first.id
+        monkeypatch.setattr(
+            postgres_db, "get_watermark", lambda table, downstream: (date_added, id_)
+        )
+        query = postgres_db._get_newer_records(
+            postgres_db.summaries, postgres_db.simple_conclusions
+        )
+        newer = {s.id for s in query}
+        expected = postgres_db.summaries.select(
+            lambda s: s.date_added > date_added
+            or (s.date_added == date_added and s.id > id_)
+        )
+        assert newer == {s.id for s in expected}
+
+
+@pytest.fixture
+def abbreviation(postgres_db):
+    abbreviation = uuid.uuid4().hex
+    yield abbreviation
+    with postgres_db.session_handler():
+        for table in (postgres_db.abbreviations, postgres_db.abbreviation_frequencies):
+            table.select(lambda a: a.abbreviation == abbreviation).delete(bulk=True)
+
+
+def test_trigger_counts_abbreviations(postgres_db, abbreviation):
+    def frequencies():
+        with postgres_db.session_handler():
+            return {
+                f.meaning: f.frequency
+                for f in postgres_db.abbreviation_frequencies.select(
+                    lambda f: f.abbreviation == abbreviation
+                )
+            }
+
+    with postgres_db.session_handler():
+        for meaning in ("aspirin", "aspirin", "acetylsalicylic acid"):
+            postgres_db.abbreviations(abbreviation=abbreviation, meaning=meaning)
+    assert frequencies() == {"aspirin": 2, "acetylsalicylic acid": 1}
+    with postgres_db.session_handler():
+        first, second, third = postgres_db.abbreviations.select(
+            lambda a: a.abbreviation == abbreviation
+        ).order_by(lambda a: a.id)
+        first.meaning = "acetylsalicylic acid"
+        third.delete()
+    assert frequencies() == {"aspirin": 1, "acetylsalicylic acid": 1}
+
+
+def test_tied_meanings_are_picked_in_order(postgres_db, abbreviation):
+    with postgres_db.session_handler():
+        for meaning in ("salicylate", "aspirin"):
+            postgres_db.abbreviations(abbreviation=abbreviation, meaning=meaning)
+    with postgres_db.session_handler():
+        meanings = dict(postgres_db.get_abbreviation_meanings())
+    assert meanings[abbreviation] == "aspirin"
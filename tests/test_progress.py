@@ -0,0 +1,110 @@
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import connectors.postgres
+from connectors.postgres import Database
+from connectors.progress import ProgressTracker
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.saved = []
+
+    def save_progress(self, state):
+        self.saved.append(state)
+
+
+def test_tracker_saves_in_background_and_on_exit():
+    db = FakeDatabase()
+    with ProgressTracker(db, "step_test", interval=0.01) as progress:
+        records = progress.read(SimpleNamespace(id=i) for i in (3, 5, 8))
+        next(records), next(records)
+        progress.checkpoint(last_written_id=42, n_rows=2)
+        next(records)
+        time.sleep(0.1)
+    assert len(db.saved) > 2
+    final = db.saved[-1]
+    assert final["finished"] is not None
+    # ID 8 was read after the last commit
+    assert (final["upstream_id"], final["n_read"], final["n_written"]) == (5, 3, 2)
+    assert final["last_written_id"] == 42
+
+
+def test_failed_run_can_be_resumed():
+    db = FakeDatabase()
+    with pytest.raises(RuntimeError):
+        with ProgressTracker(db, "step_test", interval=60) as progress:
+            progress.checkpoint(last_written_id=7, n_rows=1)
+            raise RuntimeError
+    assert db.saved[-1]["finished"] is None
+    resumed = ProgressTracker(db, "step_test", resume=db.saved[-1])
+    assert resumed.run_id == db.saved[-1]["run_id"]
+    assert resumed.n_written == 1
+
+
+def test_watermark_is_highest_date_and_id_read():
+    progress = ProgressTracker(FakeDatabase(), "step_test")
+    records = [
+        SimpleNamespace(id=4, date_added=datetime(2022, 3, 1)),
+        SimpleNamespace(id=2, date_added=datetime(2022, 3, 2)),
+        SimpleNamespace(id=3, date_added=datetime(2022, 3, 2)),
+        SimpleNamespace(id=9),
+    ]
+    list(progress.read(records))
+    assert progress.watermark == (datetime(2022, 3, 2), 3)
+
+
+class Table:
+    def __init__(self, name):
+        self._table_ = ("schema", name)
+
+
+@pytest.mark.parametrize("crash_after", [1, 2, 3])
+def test_resumed_run_writes_every_row_once(monkeypatch, crash_after):
+    monkeypatch.setattr(connectors.postgres, "commit", lambda: None)
+    monkeypatch.setattr(Database, "session_handler", property(lambda _: nullcontext))
+    written = []
+
+    def copy_tables(rows):
+        # All tables of one flush are committed together
+        ids = {}
+        for table, table_rows in rows.items():
+            if table_rows:
+                written.extend(table_rows)
+                ids[table] = list(range(len(written) - len(table_rows), len(written)))
+        return ids
+
+    db = Database.__new__(Database)
+    db._copy_tables = copy_tables
+    nodes, mentions = Table("nodes"), Table("mentions")
+    outputs = {
+        1: {"nodes": ["n1"], "mentions": ["m1"]},
+        2: {"mentions": ["m2"]},
+        3: {"nodes": ["n3"]},
+        4: {"mentions": ["m4"]},
+    }
+
+    def stage(records, crash_after=None):
+        for record in records:
+            if crash_after is not None and record.id > crash_after:
+                raise RuntimeError
+            yield {"upstream_id": record.id, **outputs[record.id]}
+
+    progress = ProgressTracker(FakeDatabase(), "step_test")
+    records = progress.read(SimpleNamespace(id=i) for i in outputs)
+    with pytest.raises(RuntimeError):
+        db._bulk_add_record(stage(records, crash_after), [nodes, mentions], 2, progress)
+    # A resumed run reads every record after `upstream_id` again
+    resumed = ProgressTracker(FakeDatabase(), "step_test")
+    records = resumed.read(
+        SimpleNamespace(id=i) for i in outputs if i > progress.upstream_id
+    )
+    db._bulk_add_record(stage(records), [nodes, mentions], 2, resumed)
+    expected = [
+        row for tables in outputs.values() for rows in tables.values() for row in rows
+    ]
+    assert sorted(written) == sorted(expected)
@@ -0,0 +1,54 @@
+import spacy
+from spacy.tokens import Doc
+
+from stages.svo import findSVO, findSVOArrays, findSVOsArrays
+
+
+def _doc(nlp, words, heads, deps, pos):
+    return Doc(nlp.vocab, words=words, heads=heads, deps=deps, pos=pos)
+
+
+def test_arrays_match_tokens_with_conjunctions_and_negation():
+    nlp = spacy.blank("en")
+    # "aspirin and heparin do not prevent strokes"
+    doc = _doc(
+        nlp,
+        ["aspirin", "and", "heparin", "do", "not", "prevent", "strokes"],
+        [5, 0, 0, 5, 5, 5, 5],
+        ["nsubj", "cc", "conj", "aux", "neg", "ROOT", "dobj"],
+        ["NOUN", "CCONJ", "NOUN", "AUX", "PART", "VERB", "NOUN"],
+    )
+    expected = [
+        ("aspirin", "!prevent", "strokes"),
+        ("heparin", "!prevent", "strokes"),
+    ]
+    assert sorted(findSVO(doc)) == expected
+    assert sorted(findSVOArrays(doc)) == expected
+
+
+def test_batched_arrays_keep_docs_apart():
+    nlp = spacy.blank("en")
+    docs = [
+        _doc(
+            nlp,
+            ["statins", "reduce", "risk"],
+            [1, 1, 1],
+            ["nsubj", "ROOT", "dobj"],
+            ["NOUN", "VERB", "NOUN"],
+        ),
+        _doc(nlp, ["none"], [0], ["ROOT"], ["NOUN"]),
+        _doc(
+            nlp,
+            ["it", "binds", "to", "receptors"],
+            [1, 1, 1, 2],
+            ["nsubj", "ROOT", "prep", "dobj"],
+            ["PRON", "VERB", "ADP", "NOUN"],
+        ),
+    ]
+    found = [svos for _, svos in findSVOsArrays(docs, batch_size=2)]
+    assert found == [
+        [("statins", "reduce", "risk")],
+        [],
+        [("it", "binds", "receptors")],
+    ]
+    assert found == [list(findSVO(doc)) for doc in docs]
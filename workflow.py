@@ -31,10 +31,13 @@ from stages.article_parser import load_article
 from stages.abbreviation_finder import find_abbreviations
 from stages.sentence_simplyfier import simplify_sentences
 
-from stages.abbreviation_substituter import substitute_abbreviations
+from stages.abbreviation_substituter import (
+    substitute_abbreviations,
+    AbbreviationDictionary,
+)
 
 from stages.triple_extractor import extract_triples
-from stages.graph_preparer import stage_nodes, stage_edges
+from stages.graph_preparer import stage_edges
 from stages.graph_writer import GraphWriter
 
 # from tests.test_database import run_tests
@@ -95,11 +98,17 @@ def simplify_conclusions_task(mode: str = "NEWER", write: bool = False) -> List[
 @task
 def substitute_abbreviation_task(mode: str = "NEWER", write: bool = False) -> None:
     db = Database.from_config(path=os.getenv("CONFIG_PATH"))
+    with db.session_handler():
+        abbreviation_dictionary = AbbreviationDictionary(
+            db.get_abbreviation_meanings(min_frequency=2)
+        )
+    logger.info(f"Loaded {len(abbreviation_dictionary)} corpus abbreviations.")
     sa = PipelineStep(
         fn=substitute_abbreviations,
         db=db,
         upstream="simple_conclusions",
         downstream="simple_substituted_conclusions",
+        func_args={"abbreviation_dictionary": abbreviation_dictionary},
     )
     simple_substituted_conclusions = sa.run_all(mode=mode, write=write)
     for simple_substituted_conclusion in simple_substituted_conclusions:
@@ -109,11 +118,15 @@ def substitute_abbreviation_task(mode: str = "NEWER", write: bool = False) -> No
 @task
 def extract_triples_task(mode: str = "NEWER", write: bool = False) -> None:
     db = Database.from_config(path=os.getenv("CONFIG_PATH"))
+    with db.session_handler():
+        known_cuis = set(db.get_known_cuis())
     tr = PipelineStep(
         fn=extract_triples,
         db=db,
         upstream="simple_substituted_conclusions",
-        downstream=["nodes", "edges"],
+        downstream=["nodes", "edges", "mentions"],
+        func_args={"known_cuis": known_cuis},
+        bulk_write=True,
     )
     triples = tr.run_all(mode=mode, write=write)
     for triple in triples:
@@ -122,22 +135,29 @@ def extract_triples_task(mode: str = "NEWER", write: bool = False) -> None:
 
 @task
 def add_to_staging_task(mode: str = "NEWER", write: bool = False) -> None:
+    # ALL stages everything again, NEWER only adds what is not staged yet
+    if mode.upper() not in ("ALL", "NEWER"):
+        raise ValueError(
+            f"Unknown staging mode '{mode}'. Allowed values are ALL, NEWER"
+        )
+    restage = mode.upper() == "ALL"
     db = Database.from_config(path=os.getenv("CONFIG_PATH"))
-    st = PipelineStep(
-        fn=stage_nodes,
-        db=db,
-        upstream="nodes",
-        downstream=["concept_nodes", "synonym_nodes", "synonym_edges"],
+    # Staged inside Postgres
+    staged = db.stage_nodes(restage=restage, dry_run=not write)
+    logger.info(
+        f"Staged {staged['concept_nodes']} concepts and "
+        f"{staged['synonym_nodes']} synonyms (write={write})."
     )
-    elems = st.run_all(mode=mode, write=write, order_by="preferred")
-    for elem in elems:
-        pass
-    # st = PipelineStep(
-    #     fn=stage_edges, db=db, upstream="edges", downstream="predicate_edges"
-    # )
-    elems = st.run_all(mode=mode, write=write)
-    for elem in elems:
-        pass
+    if restage and write:
+        db.truncate("predicate_edges")
+    with db.session_handler():
+        predicate_edges = stage_edges(db.get_edges_for_staging(restage=restage))
+        if write:
+            ids = db.bulk_add_records(predicate_edges, "predicate_edges")
+            n_edges = len(ids)
+        else:
+            n_edges = sum(1 for _ in predicate_edges)
+    logger.info(f"Staged {n_edges} predicate edges (write={write}).")
 
 
 @task